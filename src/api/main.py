@@ -1,8 +1,13 @@
 """
 FastAPI application for RAG Email System
 """
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import time
+
+import numpy as np
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
@@ -10,20 +15,140 @@ from datetime import datetime
 from src.rag.retriever import RAGRetriever, RAGFilters, RAGResult, get_rag_retriever
 from src.ingestion.pipeline import get_ingestion_pipeline
 
+
+class QueryResultCache:
+    """Approximate search-result cache keyed on the query embedding
+
+    Near-duplicate queries land in the same bucket via a random-projection
+    (SimHash-style) signature over the embedding, letting repeat searches
+    skip the vector search and graph expansion entirely. Entries expire
+    after a TTL and the cache is flushed whenever an email is ingested.
+
+    Per process: under multiple uvicorn workers an ingest only flushes
+    the worker that served it, so sibling workers may return stale
+    results for up to the TTL. Keep the TTL short enough for that to be
+    acceptable.
+    """
+
+    def __init__(self, dimension: int = 1536, num_bits: int = 32,
+                 ttl_seconds: float = 300.0, max_entries: int = 1024):
+        rng = np.random.default_rng(42)
+        self._planes = rng.standard_normal((num_bits, dimension)).astype(np.float32)
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: dict = {}
+
+    def _signature(self, embedding) -> Optional[int]:
+        vec = np.asarray(embedding, dtype=np.float32)
+        if vec.shape != (self._planes.shape[1],):
+            return None
+        bits = self._planes @ vec > 0.0
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    def get(self, embedding, params: tuple):
+        sig = self._signature(embedding)
+        if sig is None:
+            return None
+        entry = self._entries.get((sig, params))
+        if entry is None:
+            return None
+        timestamp, results = entry
+        if time.monotonic() - timestamp > self._ttl:
+            del self._entries[(sig, params)]
+            return None
+        return results
+
+    def set(self, embedding, params: tuple, results) -> None:
+        sig = self._signature(embedding)
+        if sig is None:
+            return
+        if len(self._entries) >= self._max_entries:
+            self._entries.clear()
+        self._entries[(sig, params)] = (time.monotonic(), results)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+query_cache = QueryResultCache()
+
+
+class CORSASGI:
+    """Pure ASGI CORS middleware (any origin, credentials allowed)
+
+    Avoids the per-request Request/Response allocations of the
+    BaseHTTPMiddleware-based CORSMiddleware: headers are appended as raw
+    byte tuples on "http.response.start" and preflights are answered
+    directly without entering the application. The request's Origin is
+    echoed rather than sending a literal "*" — browsers reject "*"
+    combined with allow-credentials on credentialed requests.
+    """
+
+    _BASE_HEADERS = [
+        (b"access-control-allow-methods", b"*"),
+        (b"access-control-allow-headers", b"*"),
+        (b"access-control-allow-credentials", b"true"),
+        (b"vary", b"Origin"),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        for name, value in scope.get("headers", []):
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+
+        # Non-CORS requests pass through untouched
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        cors_headers = [(b"access-control-allow-origin", origin)] + self._BASE_HEADERS
+
+        # Short-circuit preflights only — a real preflight carries both
+        # Origin and Access-Control-Request-Method; other OPTIONS
+        # requests still reach the app
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await send({
+                "type": "http.response.start",
+                "status": 204,
+                "headers": cors_headers,
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.extend(cors_headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
 app = FastAPI(
     title="RAG Email API",
     description="API for RAG-based email search and retrieval for law firm",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Compress large JSON responses (search results are body-heavy).
+# Added before CORS so the inner middleware sees uncompressed bodies.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Add CORS middleware (pure ASGI)
+app.add_middleware(CORSASGI)
 
 # Global instances (lazy-loaded)
 rag_retriever: Optional[RAGRetriever] = None
@@ -102,6 +227,12 @@ class IngestResponse(BaseModel):
     status: str
 
 
+class IngestBatchResponse(BaseModel):
+    """Batch ingestion response"""
+    email_ids: List[str]
+    status: str
+
+
 # API Endpoints
 
 @app.get("/")
@@ -158,8 +289,33 @@ async def search_emails(request: SearchRequest):
                 tags=request.filters.get("tags")
             )
 
+        # Approximate result cache: only for unfiltered graph searches
+        # (the embedding lookup itself hits the generator's LRU)
+        query_embedding = None
+        cache_params = None
+        if filters is None and request.expand_graph:
+            cache_params = (
+                request.top_k,
+                request.max_results,
+                request.expand_threads,
+                request.expand_cases,
+                request.expand_people
+            )
+            # Off the event loop: a cache miss here is a synchronous
+            # embedding HTTP round-trip
+            query_embedding = await asyncio.to_thread(
+                retriever.embedding_gen.generate, request.query
+            )
+            cached = query_cache.get(query_embedding, cache_params)
+            if cached is not None:
+                return SearchResponse(
+                    results=cached,
+                    total_results=len(cached),
+                    query=request.query
+                )
+
         # Perform search
-        results = retriever.hybrid_search(
+        results = await retriever.hybrid_search(
             query=request.query,
             top_k=request.top_k,
             filters=filters,
@@ -187,6 +343,9 @@ async def search_emails(request: SearchRequest):
             for r in results
         ]
 
+        if query_embedding is not None and cache_params is not None:
+            query_cache.set(query_embedding, cache_params, email_results)
+
         return SearchResponse(
             results=email_results,
             total_results=len(email_results),
@@ -224,12 +383,13 @@ async def simple_search(
             )
 
         # Perform search
-        results = retriever.hybrid_search(
+        results = await retriever.hybrid_search(
             query=q,
             top_k=top_k,
             filters=filters,
             expand_graph=expand,
-            max_results=top_k * 2
+            max_results=top_k * 2,
+            body_limit=500  # Truncate DB-side for the simple response
         )
 
         # Convert to response
@@ -237,7 +397,7 @@ async def simple_search(
             EmailResult(
                 email_id=r.email_id,
                 subject=r.subject,
-                body=r.body[:500],  # Truncate body for simple response
+                body=r.body[:500],  # Graph-expanded rows still carry full bodies
                 sender_email=r.sender_email,
                 sender_name=r.sender_name,
                 date=r.date,
@@ -260,7 +420,7 @@ async def simple_search(
 
 
 @app.post("/api/emails/ingest", response_model=IngestResponse)
-async def ingest_email(request: IngestEmailRequest):
+async def ingest_email(request: IngestEmailRequest, background_tasks: BackgroundTasks):
     """
     Ingest a single email into the system
 
@@ -297,8 +457,14 @@ async def ingest_email(request: IngestEmailRequest):
         # Ingest email
         email_id = pipeline.ingest_email(email_data)
 
-        # Build graph relations for this email
-        pipeline.build_graph_relations([email_id])
+        # Cached search results are stale now
+        query_cache.clear()
+        if rag_retriever is not None and rag_retriever.semantic_cache is not None:
+            rag_retriever.semantic_cache.clear()
+
+        # Build graph relations after the response is sent; the client
+        # only needs the insert ACK
+        background_tasks.add_task(pipeline.build_graph_relations, [email_id])
 
         return IngestResponse(
             email_id=email_id,
@@ -309,25 +475,74 @@ async def ingest_email(request: IngestEmailRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/emails/ingest/batch", response_model=IngestBatchResponse)
+async def ingest_emails_batch(requests: List[IngestEmailRequest], background_tasks: BackgroundTasks):
+    """
+    Ingest a batch of emails (max 100) in one embedding call and one INSERT
+    """
+    if len(requests) > 100:
+        raise HTTPException(status_code=422, detail="Batch size is limited to 100 emails")
+
+    try:
+        pipeline = get_pipeline()
+
+        emails_data = [
+            {
+                "subject": request.subject,
+                "body": request.body,
+                "sender_email": request.sender_email,
+                "sender_name": request.sender_name,
+                "recipients": request.recipients,
+                "cc": request.cc,
+                "date": request.date or datetime.now().isoformat(),
+                "thread_id": request.thread_id or "",
+                "message_id": request.message_id or "",
+                "in_reply_to": request.in_reply_to,
+                "has_attachments": request.has_attachments
+            }
+            for request in requests
+        ]
+
+        # One embedding batch + one INSERT for the whole request
+        email_ids = pipeline.ingest_emails_bulk(emails_data)
+
+        # Cached search results are stale now
+        query_cache.clear()
+        if rag_retriever is not None and rag_retriever.semantic_cache is not None:
+            rag_retriever.semantic_cache.clear()
+
+        # Build graph relations after the response is sent
+        background_tasks.add_task(pipeline.build_graph_relations, email_ids)
+
+        return IngestBatchResponse(
+            email_ids=email_ids,
+            status="success"
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/stats")
 async def get_stats():
     """Get system statistics"""
     try:
         retriever = get_retriever()
 
-        # Get email count
-        email_count_result = retriever.db.query("SELECT count() FROM email GROUP ALL;")
+        # Both stats statements in one round-trip: the /sql endpoint
+        # returns one result entry per semicolon-separated statement
+        results = await retriever.db.aquery(
+            "SELECT count() FROM email GROUP ALL;"
+            " SELECT category, count() FROM email GROUP BY category;"
+        )
+
         email_count = 0
-        if email_count_result and email_count_result[0].get("result"):
-            email_count = email_count_result[0]["result"][0].get("count", 0)
+        if len(results) > 0 and results[0].get("result"):
+            email_count = results[0]["result"][0].get("count", 0)
 
-        # Get category distribution
-        category_result = retriever.db.query(
-            "SELECT category, count() FROM email GROUP BY category;"
-        )
         categories = {}
-        if category_result and category_result[0].get("result"):
-            for item in category_result[0]["result"]:
+        if len(results) > 1 and results[1].get("result"):
+            for item in results[1]["result"]:
                 categories[item.get("category", "unknown")] = item.get("count", 0)
 
         return {
@@ -346,5 +561,16 @@ if __name__ == "__main__":
 
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", "8000"))
-
-    uvicorn.run(app, host=host, port=port)
+    workers = int(os.getenv("API_WORKERS", os.cpu_count() or 1))
+
+    # uvloop + httptools parser, multiple workers (app passed as import
+    # string, required for multi-worker mode)
+    uvicorn.run(
+        "src.api.main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
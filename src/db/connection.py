@@ -3,9 +3,22 @@ SurrealDB connection module using HTTP API
 """
 import httpx
 import json
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 from base64 import b64encode
 
+try:
+    import orjson
+
+    def _dumps(data: Any) -> str:
+        """Serialize data to JSON (numpy-aware fast path)"""
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+except ImportError:  # pragma: no cover - orjson is in requirements
+    def _dumps(data: Any) -> str:
+        """Serialize data to JSON (stdlib fallback)"""
+        return json.dumps(data, default=lambda o: o.tolist())
+
 
 class SurrealDBClient:
     """HTTP client for SurrealDB"""
@@ -34,14 +47,42 @@ class SurrealDBClient:
             "Content-Type": "text/plain"
         }
 
+        # Sync client for the ingestion/script path
         self.client = httpx.Client(timeout=30.0)
 
-    def query(self, sql: str) -> List[Dict[str, Any]]:
+        # Async client for the API path: HTTP/2 multiplexing + pooling
+        self.aclient = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            timeout=30.0
+        )
+
+    def _check_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Raise on statement-level errors in a query response"""
+        for result in results:
+            if result.get("status") == "ERR":
+                raise Exception(f"Query error: {result.get('result', 'Unknown error')}")
+        return results
+
+    @staticmethod
+    def _encode_variables(variables: Dict[str, Any]) -> Dict[str, str]:
+        """Encode bind variables for the /sql endpoint query string
+
+        Every value is JSON-encoded — including strings, which must
+        arrive quoted: the server parses each param as a value, so a
+        raw string that happens to look like a JSON scalar ("12345",
+        "true") would bind as a number or bool and an equality filter
+        on it would silently match nothing.
+        """
+        return {key: _dumps(value) for key, value in variables.items()}
+
+    def query(self, sql: str, variables: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Execute a SurrealQL query
 
         Args:
-            sql: SurrealQL query string
+            sql: SurrealQL query string (may reference $variables)
+            variables: Optional bind variables
 
         Returns:
             List of query results
@@ -49,20 +90,37 @@ class SurrealDBClient:
         response = self.client.post(
             self.url,
             headers=self.headers,
-            content=sql
+            content=sql,
+            params=self._encode_variables(variables) if variables else None
         )
 
         if response.status_code != 200:
             raise Exception(f"Query failed: {response.text}")
 
-        results = response.json()
+        return self._check_results(response.json())
 
-        # Check for errors in results
-        for result in results:
-            if result.get("status") == "ERR":
-                raise Exception(f"Query error: {result.get('result', 'Unknown error')}")
+    async def aquery(self, sql: str, variables: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Execute a SurrealQL query asynchronously
 
-        return results
+        Args:
+            sql: SurrealQL query string (may reference $variables)
+            variables: Optional bind variables
+
+        Returns:
+            List of query results
+        """
+        response = await self.aclient.post(
+            self.url,
+            headers=self.headers,
+            content=sql,
+            params=self._encode_variables(variables) if variables else None
+        )
+
+        if response.status_code != 200:
+            raise Exception(f"Query failed: {response.text}")
+
+        return self._check_results(response.json())
 
     def query_single(self, sql: str) -> Optional[Dict[str, Any]]:
         """Execute a query and return the first result"""
@@ -82,16 +140,45 @@ class SurrealDBClient:
         Returns:
             Created record
         """
-        # Convert data to JSON string
-        data_json = json.dumps(data)
-        sql = f"CREATE {table} CONTENT {data_json};"
+        sql = f"CREATE {table} CONTENT $data;"
 
-        result = self.query(sql)
+        result = self.query(sql, {"data": data})
         if result and result[0].get("result"):
             return result[0]["result"][0] if isinstance(result[0]["result"], list) else result[0]["result"]
 
         raise Exception("Failed to create record")
 
+    def create_many(self, table: str, rows: List[Dict[str, Any]], chunk_size: int = 500) -> List[Dict[str, Any]]:
+        """
+        Create multiple records with one INSERT statement per chunk
+
+        Chunking keeps each request at a bounded size (email rows carry
+        1536-float embeddings) while still collapsing N round-trips into
+        N / chunk_size.
+
+        Args:
+            table: Table name
+            rows: List of record data dicts
+            chunk_size: Max rows per INSERT statement
+
+        Returns:
+            Created records, in input order
+        """
+        if not rows:
+            return []
+
+        sql = f"INSERT INTO {table} $data;"
+
+        created: List[Dict[str, Any]] = []
+        for start in range(0, len(rows), chunk_size):
+            result = self.query(sql, {"data": rows[start:start + chunk_size]})
+            if not result or result[0].get("result") is None:
+                raise Exception("Failed to create records")
+            res = result[0]["result"]
+            created.extend(res if isinstance(res, list) else [res])
+
+        return created
+
     def select(self, table: str, record_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Select records from a table
@@ -128,24 +215,45 @@ class SurrealDBClient:
             Created relation
         """
         if data:
-            data_json = json.dumps(data)
-            sql = f"RELATE {from_record}->{relation_table}->{to_record} CONTENT {data_json};"
+            sql = f"RELATE {from_record}->{relation_table}->{to_record} CONTENT $data;"
+            result = self.query(sql, {"data": data})
         else:
             sql = f"RELATE {from_record}->{relation_table}->{to_record};"
-
-        result = self.query(sql)
+            result = self.query(sql)
         if result and result[0].get("result"):
             return result[0]["result"][0] if isinstance(result[0]["result"], list) else result[0]["result"]
 
         raise Exception("Failed to create relation")
 
+    def relate_many(self, relation_table: str, pairs: List[tuple], chunk_size: int = 1000) -> None:
+        """
+        Create many relations with one round-trip per chunk
+
+        Each pair becomes a RELATE statement; statements are joined and
+        sent chunk_size at a time so a large graph build costs a handful
+        of requests instead of one per edge.
+
+        Args:
+            relation_table: Relation table name
+            pairs: List of (from_record, to_record) ID tuples
+            chunk_size: Max RELATE statements per request
+        """
+        for start in range(0, len(pairs), chunk_size):
+            chunk = pairs[start:start + chunk_size]
+            sql = "\n".join(
+                f"RELATE {from_record}->{relation_table}->{to_record};"
+                for from_record, to_record in chunk
+            )
+            self.query(sql)
+
     def vector_search(
         self,
         table: str,
         field: str,
-        embedding: List[float],
+        embedding: Any,
         limit: int = 10,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        body_limit: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Perform vector similarity search
@@ -153,48 +261,93 @@ class SurrealDBClient:
         Args:
             table: Table name
             field: Embedding field name
-            embedding: Query embedding vector
+            embedding: Query embedding vector (list or numpy array)
             limit: Number of results
             filters: Optional WHERE clause filters
+            body_limit: Truncate the body field to this many chars DB-side
 
         Returns:
             List of similar records with similarity scores
         """
-        # Convert embedding to JSON array
-        embedding_json = json.dumps(embedding)
+        sql, variables = self._vector_search_sql(table, field, embedding, limit, filters, body_limit)
 
-        # Build WHERE clause
+        result = self.query(sql, variables)
+        if result and result[0].get("result") is not None:
+            res = result[0]["result"]
+            return res if isinstance(res, list) else [res]
+        return []
+
+    async def avector_search(
+        self,
+        table: str,
+        field: str,
+        embedding: Any,
+        limit: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        body_limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Async variant of vector_search"""
+        sql, variables = self._vector_search_sql(table, field, embedding, limit, filters, body_limit)
+
+        result = await self.aquery(sql, variables)
+        if result and result[0].get("result") is not None:
+            res = result[0]["result"]
+            return res if isinstance(res, list) else [res]
+        return []
+
+    def _vector_search_sql(
+        self,
+        table: str,
+        field: str,
+        embedding: Any,
+        limit: int,
+        filters: Optional[Dict[str, Any]],
+        body_limit: Optional[int] = None
+    ) -> tuple:
+        """Build the parameterized vector similarity search query
+
+        Filter values and the embedding are bound as $variables so the
+        query text stays constant across calls (no per-call embedding
+        serialization into the statement, no value interpolation).
+        """
+        variables: Dict[str, Any] = {"embedding": embedding}
+
+        # Truncate bodies in the projection so oversized text never
+        # leaves the database
+        projection = "*"
+        if body_limit is not None:
+            projection = "*, string::slice(body, 0, $body_limit) AS body"
+            variables["body_limit"] = int(body_limit)
+
+        # Build WHERE clause with bound filter values
         where_clause = ""
         if filters:
             conditions = []
-            for key, value in filters.items():
-                if isinstance(value, str):
-                    conditions.append(f"{key} = '{value}'")
-                else:
-                    conditions.append(f"{key} = {json.dumps(value)}")
+            for i, (key, value) in enumerate(filters.items()):
+                param = f"filter_{i}"
+                conditions.append(f"{key} = ${param}")
+                variables[param] = value
             if conditions:
                 where_clause = "WHERE " + " AND ".join(conditions)
 
-        # Build query
         sql = f"""
-        SELECT *,
-            vector::similarity::cosine({field}, {embedding_json}) AS similarity
+        SELECT {projection},
+            vector::similarity::cosine({field}, $embedding) AS similarity
         FROM {table}
         {where_clause}
         ORDER BY similarity DESC
-        LIMIT {limit};
+        LIMIT {int(limit)};
         """
-
-        result = self.query(sql)
-        if result and result[0].get("result") is not None:
-            res = result[0]["result"]
-            return res if isinstance(res, list) else [res]
-        return []
+        return sql, variables
 
     def close(self):
-        """Close the HTTP client"""
+        """Close the HTTP clients"""
         self.client.close()
 
+    async def aclose(self):
+        """Close the async HTTP client"""
+        await self.aclient.aclose()
+
     def __enter__(self):
         return self
 
@@ -202,8 +355,13 @@ class SurrealDBClient:
         self.close()
 
 
+@lru_cache(maxsize=None)
 def get_db_client() -> SurrealDBClient:
-    """Factory function to create a database client with environment variables"""
+    """Factory function to create a database client with environment variables
+
+    Memoized: the API, pipeline, and retriever all share one client and
+    therefore one HTTP connection pool, instead of each opening its own.
+    """
     import os
     from dotenv import load_dotenv
 
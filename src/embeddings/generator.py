@@ -1,32 +1,105 @@
 """
 Embedding generation module
-Supports OpenAI and local models
+Supports OpenAI, local, and remote embedding-server models
 """
+import hashlib
 import os
-from typing import List, Union
+from functools import lru_cache
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+import httpx
+import numpy as np
 from openai import OpenAI
 
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is in requirements
+    tiktoken = None
+
+# Maximum number of query embeddings kept in the in-process LRU cache
+_CACHE_MAX_SIZE = 4096
+
+# Batch sizes for the embedding forward pass: the OpenAI API caps one
+# request at 2048 inputs; local models saturate well below that
+_OPENAI_MAX_BATCH = 2048
+_LOCAL_BATCH_SIZE = 64
+
+# Remote embedding server: texts per request and parallel requests
+_REMOTE_MAX_BATCH = 256
+_REMOTE_CONCURRENCY = 4
+
+# Prepared-text memo size: repeated ingests of the same mailbox skip
+# the signature/quote stripping and tokenizer truncation entirely
+_PREPARED_TEXT_CACHE_SIZE = 8192
+
+# Token budget per embedded email: retrieval quality saturates well
+# before this, and tokens drive OpenAI latency and cost
+_MAX_EMAIL_TOKENS = 512
+
+# Quoted-reply chains (lines starting with '>') and trailing signatures
+_QUOTED_REPLY_RE = re.compile(r'\n>.*')
+_SIGNATURE_RE = re.compile(r'\n-- \n.*', re.DOTALL)
+
 
 class EmbeddingGenerator:
-    """Generate embeddings for text using OpenAI or local models"""
+    """Generate embeddings for text using OpenAI, local, or remote models"""
 
     def __init__(
         self,
         provider: str = "openai",
         model: str = "text-embedding-3-large",
-        dimension: int = 1536
+        dimension: int = 1536,
+        batch_size: int = _LOCAL_BATCH_SIZE,
+        cache_dir: Optional[str] = None
     ):
         """
         Initialize embedding generator
 
         Args:
-            provider: "openai" or "local"
+            provider: "openai", "local" or "remote"
             model: Model name
             dimension: Embedding dimension
+            batch_size: Per-forward-pass batch size for local models
+            cache_dir: Directory for the on-disk email-embedding cache,
+                or None to disable it
         """
         self.provider = provider
         self.model = model
         self.dimension = dimension
+        self.batch_size = batch_size
+
+        # On-disk cache of email embeddings keyed by content hash, so
+        # re-ingesting the same mailbox skips the encoder entirely
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # Bounded LRU cache for single-text embeddings (query path)
+        self._cache: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # Memoize text preparation per instance: tiktoken encode/decode
+        # dominates _prepare_email_text and re-runs on every ingest of
+        # an unchanged email otherwise
+        self._prepare_email_text = lru_cache(maxsize=_PREPARED_TEXT_CACHE_SIZE)(
+            self._prepare_email_text_uncached
+        )
+
+        # Tokenizer used to truncate email inputs before embedding.
+        # tiktoken fetches its BPE table on first use; fall back to a
+        # character cap if the tokenizer cannot be loaded.
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except Exception:
+                try:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    self._encoding = None
 
         if provider == "openai":
             api_key = os.getenv("OPENAI_API_KEY")
@@ -37,10 +110,17 @@ class EmbeddingGenerator:
             # Initialize local model (sentence-transformers)
             from sentence_transformers import SentenceTransformer
             self.model_instance = SentenceTransformer(model)
+        elif provider == "remote":
+            # Dedicated embedding server (GPU host); see EMBEDDING_SERVER_URL
+            server_url = os.getenv("EMBEDDING_SERVER_URL")
+            if not server_url:
+                raise ValueError("EMBEDDING_SERVER_URL not found in environment")
+            self.server_url = server_url.rstrip('/')
+            self.http = httpx.Client(timeout=60.0)
         else:
             raise ValueError(f"Unknown provider: {provider}")
 
-    def generate(self, text: Union[str, List[str]]) -> Union[List[float], List[List[float]]]:
+    def generate(self, text: Union[str, List[str]]) -> Union[np.ndarray, List[np.ndarray]]:
         """
         Generate embeddings for text
 
@@ -48,42 +128,164 @@ class EmbeddingGenerator:
             text: Single text or list of texts
 
         Returns:
-            Single embedding or list of embeddings
+            Single embedding or list of embeddings (float32 arrays)
         """
         if isinstance(text, str):
             return self._generate_single(text)
         else:
             return self._generate_batch(text)
 
-    def _generate_single(self, text: str) -> List[float]:
-        """Generate embedding for a single text"""
+    @staticmethod
+    def _cache_key(text: str) -> bytes:
+        """Compute a compact cache key for a text"""
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def _generate_single(self, text: str) -> np.ndarray:
+        """Generate embedding for a single text (cached)"""
+        key = self._cache_key(text)
+
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
         if self.provider == "openai":
             response = self.client.embeddings.create(
                 model=self.model,
                 input=text,
                 dimensions=self.dimension
             )
-            return response.data[0].embedding
+            embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
 
         elif self.provider == "local":
-            embedding = self.model_instance.encode(text)
-            return embedding.tolist()
+            embedding = np.asarray(self.model_instance.encode(text), dtype=np.float32)
+
+        elif self.provider == "remote":
+            embedding = self._remote_encode([text])[0]
+
+        with self._cache_lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > _CACHE_MAX_SIZE:
+                self._cache.popitem(last=False)
+
+        return embedding
+
+    def _generate_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Generate embeddings for multiple texts
+
+        Duplicate texts (common in thread-heavy batches) are embedded
+        once and mapped back to their original positions.
+        """
+        unique_index: dict = {}
+        inverse = []
+        for text in texts:
+            inverse.append(unique_index.setdefault(text, len(unique_index)))
+        unique_texts = list(unique_index)
 
-    def _generate_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
         if self.provider == "openai":
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=texts,
-                dimensions=self.dimension
-            )
-            return [item.embedding for item in response.data]
+            unique_embeddings = []
+            for start in range(0, len(unique_texts), _OPENAI_MAX_BATCH):
+                response = self.client.embeddings.create(
+                    model=self.model,
+                    input=unique_texts[start:start + _OPENAI_MAX_BATCH],
+                    dimensions=self.dimension
+                )
+                unique_embeddings.extend(
+                    np.asarray(item.embedding, dtype=np.float32) for item in response.data
+                )
 
         elif self.provider == "local":
-            embeddings = self.model_instance.encode(texts)
-            return [emb.tolist() for emb in embeddings]
+            # encode() length-sorts the inputs internally and restores
+            # the original order afterwards, so each batch is padded to
+            # near-uniform length — no extra smart-batching pass needed
+            embeddings = self.model_instance.encode(
+                unique_texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True
+            )
+            unique_embeddings = [np.asarray(emb, dtype=np.float32) for emb in embeddings]
+
+        elif self.provider == "remote":
+            chunks = [
+                unique_texts[start:start + _REMOTE_MAX_BATCH]
+                for start in range(0, len(unique_texts), _REMOTE_MAX_BATCH)
+            ]
+            if len(chunks) == 1:
+                unique_embeddings = self._remote_encode(chunks[0])
+            else:
+                # Keep a few requests in flight so the GPU server stays fed
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=_REMOTE_CONCURRENCY) as pool:
+                    unique_embeddings = [
+                        embedding
+                        for chunk_result in pool.map(self._remote_encode, chunks)
+                        for embedding in chunk_result
+                    ]
+
+        return [unique_embeddings[i] for i in inverse]
+
+    def _remote_encode(self, texts: List[str]) -> List[np.ndarray]:
+        """POST a batch of texts to the embedding server"""
+        response = self.http.post(
+            f"{self.server_url}/embed",
+            json={"model": self.model, "texts": texts}
+        )
+        if response.status_code != 200:
+            raise Exception(f"Embedding server error: {response.text}")
+
+        return [
+            np.asarray(embedding, dtype=np.float32)
+            for embedding in response.json()["embeddings"]
+        ]
 
-    def generate_for_email(self, subject: str, body: str) -> List[float]:
+    def _prepare_email_text_uncached(self, subject: str, body: str) -> str:
+        """Build the text to embed for an email
+
+        Strips the quoted-reply chain and trailing signature, then
+        truncates to _MAX_EMAIL_TOKENS so long threads don't inflate
+        embedding latency and cost.
+        """
+        body = _SIGNATURE_RE.sub('', body)
+        body = _QUOTED_REPLY_RE.split(body, maxsplit=1)[0]
+
+        # Combine subject and body with emphasis on subject
+        text = f"Sujet: {subject}\n\nCorps: {body}"
+
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            if len(tokens) > _MAX_EMAIL_TOKENS:
+                text = self._encoding.decode(tokens[:_MAX_EMAIL_TOKENS])
+        else:
+            # No tokenizer available: approximate with ~4 chars per token
+            text = text[:_MAX_EMAIL_TOKENS * 4]
+
+        return text
+
+    def _disk_cache_path(self, text: str) -> str:
+        """Path of the cached embedding for a prepared email text"""
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npy")
+
+    def _disk_cache_get(self, text: str) -> Optional[np.ndarray]:
+        """Load a cached embedding, or None on miss"""
+        path = self._disk_cache_path(text)
+        if os.path.exists(path):
+            try:
+                return np.load(path)
+            except Exception:
+                return None
+        return None
+
+    def _disk_cache_put(self, text: str, embedding: np.ndarray) -> None:
+        """Persist an embedding for future runs"""
+        try:
+            np.save(self._disk_cache_path(text), embedding)
+        except OSError:
+            pass  # Cache is best-effort
+
+    def generate_for_email(self, subject: str, body: str) -> np.ndarray:
         """
         Generate embedding for an email
 
@@ -94,22 +296,70 @@ class EmbeddingGenerator:
         Returns:
             Embedding vector
         """
-        # Combine subject and body with emphasis on subject
-        text = f"Sujet: {subject}\n\nCorps: {body}"
-        return self.generate(text)
+        text = self._prepare_email_text(subject, body)
+
+        if self.cache_dir is None:
+            return self.generate(text)
 
+        cached = self._disk_cache_get(text)
+        if cached is not None:
+            return cached
 
+        embedding = self.generate(text)
+        self._disk_cache_put(text, embedding)
+        return embedding
+
+    def generate_for_emails(self, subjects: List[str], bodies: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings for multiple emails in one batch call
+
+        Args:
+            subjects: Email subjects
+            bodies: Email bodies (parallel to subjects)
+
+        Returns:
+            List of embedding vectors, in input order
+        """
+        texts = [
+            self._prepare_email_text(subject, body)
+            for subject, body in zip(subjects, bodies)
+        ]
+
+        if self.cache_dir is None:
+            return self._generate_batch(texts)
+
+        # Serve what the disk cache has; embed only the misses
+        embeddings: List[Optional[np.ndarray]] = [self._disk_cache_get(t) for t in texts]
+        miss_indices = [i for i, emb in enumerate(embeddings) if emb is None]
+
+        if miss_indices:
+            fresh = self._generate_batch([texts[i] for i in miss_indices])
+            for i, embedding in zip(miss_indices, fresh):
+                self._disk_cache_put(texts[i], embedding)
+                embeddings[i] = embedding
+
+        return embeddings
+
+
+@lru_cache(maxsize=None)
 def get_embedding_generator() -> EmbeddingGenerator:
-    """Factory function to create embedding generator from environment"""
+    """Factory function to create embedding generator from environment
+
+    Memoized so all callers share one generator and its embedding caches.
+    """
     from dotenv import load_dotenv
     load_dotenv()
 
     provider = os.getenv("EMBEDDING_PROVIDER", "openai")
     model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
     dimension = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+    batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", str(_LOCAL_BATCH_SIZE)))
+    cache_dir = os.getenv("EMBEDDING_CACHE_DIR") or None
 
     return EmbeddingGenerator(
         provider=provider,
         model=model,
-        dimension=dimension
+        dimension=dimension,
+        batch_size=batch_size,
+        cache_dir=cache_dir
     )
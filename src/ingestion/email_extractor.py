@@ -1,13 +1,53 @@
 """
 Email extraction from IMAP servers (Gmail, Outlook, etc.)
 """
+import asyncio
 import imaplib
 import email
+import email.message
+from email import policy
 from email.header import decode_header
+from email.message import EmailMessage
+from email.parser import BytesParser
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import re
 
+# Messages fetched per IMAP FETCH command and parse worker count
+_FETCH_CHUNK_SIZE = 500
+_PARSE_WORKERS = 8
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:  # pragma: no cover - selectolax is in requirements
+    HTMLParser = None
+
+try:
+    import aioimaplib
+except ImportError:  # pragma: no cover - aioimaplib is in requirements
+    aioimaplib = None
+
+# Pre-compiled patterns (hot path: one probe per parsed email)
+_ANGLE_ADDR_RE = re.compile(r'<(.+?)>')
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# Modern parser: faster header parsing than compat32 message_from_bytes
+# and yields EmailMessage with get_body()/iter_attachments()
+_PARSER = BytesParser(policy=policy.default)
+
+
+def _html_to_text(html: str) -> str:
+    """Convert HTML to plain text (C-backed parser, regex fallback)"""
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        node = tree.body or tree.root
+        if node is not None:
+            return node.text(separator=' ', strip=True)
+        return ""
+    # Fallback: simple HTML tag stripping
+    return _HTML_TAG_RE.sub('', html)
+
 
 class EmailExtractor:
     """Extract emails from IMAP server"""
@@ -57,44 +97,80 @@ class EmailExtractor:
 
         return ' '.join(result)
 
-    def _extract_body(self, msg: email.message.Message) -> str:
-        """Extract email body (text/plain or text/html)"""
-        body = ""
-
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                disposition = str(part.get("Content-Disposition", ""))
-
-                # Skip attachments
-                if "attachment" in disposition:
-                    continue
-
-                if content_type == "text/plain":
-                    try:
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            body += payload.decode('utf-8', errors='ignore')
-                    except:
-                        pass
-                elif content_type == "text/html" and not body:
-                    try:
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            html = payload.decode('utf-8', errors='ignore')
-                            # Simple HTML to text conversion
-                            body = re.sub(r'<[^>]+>', '', html)
-                    except:
-                        pass
-        else:
+    def _extract_parts(self, msg: email.message.Message) -> tuple:
+        """Extract body and attachment presence in a single pass
+
+        Returns:
+            (body, has_attachments) tuple
+        """
+        # EmailMessage (policy=default): get_body picks the best part
+        # directly, no manual walk needed
+        if isinstance(msg, EmailMessage):
+            has_attachments = next(msg.iter_attachments(), None) is not None
+
+            part = msg.get_body(preferencelist=('plain', 'html'))
+            if part is None:
+                return "", has_attachments
+
+            try:
+                content = part.get_content()
+            except Exception:
+                payload = part.get_payload(decode=True)
+                content = payload.decode('utf-8', errors='ignore') if payload else ""
+
+            if part.get_content_type() == "text/html":
+                content = _html_to_text(content)
+
+            return content.strip(), has_attachments
+
+        # Simple (non-multipart) messages never need a walk
+        if not msg.is_multipart():
+            body = ""
             try:
                 payload = msg.get_payload(decode=True)
                 if payload:
                     body = payload.decode('utf-8', errors='ignore')
             except:
                 pass
+            return body.strip(), False
+
+        # Accumulate raw bytes and decode/join once at the end
+        text_parts = []
+        html_fallback = None
+        has_attachments = False
+
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            disposition = str(part.get("Content-Disposition", ""))
+
+            # Record and skip attachments
+            if "attachment" in disposition:
+                has_attachments = True
+                continue
 
-        return body.strip()
+            if content_type == "text/plain":
+                try:
+                    payload = part.get_payload(decode=True)
+                    if payload:
+                        text_parts.append(payload)
+                except:
+                    pass
+            elif content_type == "text/html" and html_fallback is None:
+                try:
+                    payload = part.get_payload(decode=True)
+                    if payload:
+                        html_fallback = payload
+                except:
+                    pass
+
+        if text_parts:
+            body = b"".join(text_parts).decode('utf-8', errors='ignore')
+        elif html_fallback is not None:
+            body = _html_to_text(html_fallback.decode('utf-8', errors='ignore'))
+        else:
+            body = ""
+
+        return body.strip(), has_attachments
 
     def _parse_email(self, msg: email.message.Message) -> Dict[str, Any]:
         """Parse email message into structured data"""
@@ -109,7 +185,7 @@ class EmailExtractor:
         references = msg.get("References", "")
 
         # Parse sender
-        sender_match = re.search(r'<(.+?)>', from_header)
+        sender_match = _ANGLE_ADDR_RE.search(from_header)
         if sender_match:
             sender_email = sender_match.group(1)
             sender_name = from_header.split('<')[0].strip().strip('"')
@@ -135,27 +211,19 @@ class EmailExtractor:
         except:
             email_date = datetime.now()
 
-        # Extract body
-        body = self._extract_body(msg)
+        # Extract body and attachment presence in one walk
+        body, has_attachments = self._extract_parts(msg)
 
         # Generate thread_id from references or message-id
         thread_id = ""
         if references:
             # Use first message-id in references as thread_id
-            ref_match = re.search(r'<(.+?)>', references)
+            ref_match = _ANGLE_ADDR_RE.search(references)
             if ref_match:
                 thread_id = ref_match.group(1)
         if not thread_id and message_id:
             thread_id = message_id
 
-        # Check for attachments
-        has_attachments = False
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get("Content-Disposition", "").startswith("attachment"):
-                    has_attachments = True
-                    break
-
         return {
             "subject": subject,
             "body": body,
@@ -207,28 +275,43 @@ class EmailExtractor:
         if limit:
             email_ids = email_ids[-limit:]  # Get most recent emails
 
-        emails = []
-
-        for email_id in email_ids:
+        # Fetch messages in chunks: one FETCH round-trip per chunk
+        # instead of one per message (BODY.PEEK[] avoids marking seen)
+        raw_messages = []
+        for start in range(0, len(email_ids), _FETCH_CHUNK_SIZE):
+            chunk = email_ids[start:start + _FETCH_CHUNK_SIZE]
             try:
-                # Fetch email
-                status, msg_data = self.imap.fetch(email_id, "(RFC822)")
+                status, msg_data = self.imap.fetch(b",".join(chunk), "(BODY.PEEK[])")
+            except Exception as e:
+                print(f"Error fetching emails {chunk[0]}..{chunk[-1]}: {e}")
+                continue
 
-                if status != "OK":
-                    continue
+            if status != "OK":
+                continue
 
-                # Parse email
-                msg = email.message_from_bytes(msg_data[0][1])
-                parsed_email = self._parse_email(msg)
-                emails.append(parsed_email)
+            for item in msg_data:
+                if isinstance(item, tuple) and len(item) >= 2:
+                    raw_messages.append(item[1])
 
-            except Exception as e:
-                print(f"Error parsing email {email_id}: {e}")
-                continue
+        # Parsing (header decode, HTML stripping) is CPU-bound: do it in parallel
+        emails = []
+        with ThreadPoolExecutor(max_workers=_PARSE_WORKERS) as executor:
+            for parsed_email in executor.map(self._parse_raw, raw_messages):
+                if parsed_email is not None:
+                    emails.append(parsed_email)
 
         print(f"Fetched {len(emails)} emails from {folder}")
         return emails
 
+    def _parse_raw(self, raw: bytes) -> Optional[Dict[str, Any]]:
+        """Parse a raw RFC822 message, returning None on failure"""
+        try:
+            msg = _PARSER.parsebytes(raw)
+            return self._parse_email(msg)
+        except Exception as e:
+            print(f"Error parsing email: {e}")
+            return None
+
     def __enter__(self):
         self.connect()
         return self
@@ -237,6 +320,113 @@ class EmailExtractor:
         self.disconnect()
 
 
+class AsyncEmailExtractor(EmailExtractor):
+    """Async IMAP extractor using aioimaplib
+
+    aioimaplib pipelines FETCH commands on a connection via IMAP tags,
+    so several extractors (one per folder/mailbox) can run concurrently
+    under asyncio instead of serializing behind one blocking socket.
+    Parsing helpers are inherited from EmailExtractor.
+    """
+
+    async def connect(self):
+        """Connect to IMAP server"""
+        if aioimaplib is None:
+            raise RuntimeError("aioimaplib is required for AsyncEmailExtractor")
+
+        self.imap = aioimaplib.IMAP4_SSL(self.server)
+        await self.imap.wait_hello_from_server()
+        await self.imap.login(self.email_address, self.password)
+        print(f"Connected to {self.server}")
+
+    async def disconnect(self):
+        """Disconnect from IMAP server"""
+        if self.imap:
+            await self.imap.close()
+            await self.imap.logout()
+
+    async def fetch_emails(
+        self,
+        folder: str = "INBOX",
+        limit: Optional[int] = None,
+        search_criteria: str = "ALL"
+    ) -> List[Dict[str, Any]]:
+        """Async variant of EmailExtractor.fetch_emails"""
+        if not self.imap:
+            await self.connect()
+
+        await self.imap.select(folder)
+
+        status, messages = await self.imap.search(search_criteria)
+
+        if status != "OK":
+            print(f"Failed to search emails: {status}")
+            return []
+
+        email_ids = messages[0].split()
+
+        if limit:
+            email_ids = email_ids[-limit:]  # Get most recent emails
+
+        raw_messages = []
+        for start in range(0, len(email_ids), _FETCH_CHUNK_SIZE):
+            chunk = email_ids[start:start + _FETCH_CHUNK_SIZE]
+            try:
+                status, msg_data = await self.imap.fetch(
+                    b",".join(chunk).decode(), "(BODY.PEEK[])"
+                )
+            except Exception as e:
+                print(f"Error fetching emails {chunk[0]}..{chunk[-1]}: {e}")
+                continue
+
+            if status != "OK":
+                continue
+
+            for item in msg_data:
+                if isinstance(item, (bytes, bytearray)) and b"\r\n" in item:
+                    raw_messages.append(bytes(item))
+
+        # Parse off the event loop: header decode / HTML stripping is CPU-bound
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=_PARSE_WORKERS) as executor:
+            parsed = await asyncio.gather(*(
+                loop.run_in_executor(executor, self._parse_raw, raw)
+                for raw in raw_messages
+            ))
+
+        emails = [p for p in parsed if p is not None]
+        print(f"Fetched {len(emails)} emails from {folder}")
+        return emails
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.disconnect()
+
+
+async def fetch_folders_concurrently(
+    server: str,
+    email_address: str,
+    password: str,
+    folders: List[str],
+    limit: Optional[int] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch several folders in parallel, one async extractor per folder
+
+    Returns:
+        Dict mapping folder name to its parsed emails
+    """
+    async def fetch_one(folder: str) -> List[Dict[str, Any]]:
+        async with AsyncEmailExtractor(server, email_address, password) as extractor:
+            return await extractor.fetch_emails(folder=folder, limit=limit)
+
+    results = await asyncio.gather(*(fetch_one(folder) for folder in folders))
+    return dict(zip(folders, results))
+
+
 def get_email_extractor() -> EmailExtractor:
     """Factory function to create email extractor from environment"""
     import os
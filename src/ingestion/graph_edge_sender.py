@@ -0,0 +1,117 @@
+"""
+Background batched writer for graph edges
+Accumulates RELATE pairs and flushes them in bulk on size or timeout
+"""
+import logging
+import queue
+import threading
+from collections import defaultdict
+from time import monotonic
+from typing import Dict, List, Tuple
+
+from src.db.connection import SurrealDBClient
+
+logger = logging.getLogger(__name__)
+
+_SENTINEL = object()
+
+# Flush when this many edges are pending...
+_DEFAULT_MAX_ROWS = 1000
+
+# ...or this long after the first pending edge arrived, whichever
+# comes first — a trickle of edges never waits long, a flood batches up
+_DEFAULT_FLUSH_INTERVAL = 0.05
+
+
+class GraphEdgeSender:
+    """Batch graph edges on a background thread
+
+    Producers hand over (relation, from, to) edges without blocking on
+    the database; a worker thread groups them by relation table and
+    writes each group through relate_many when either the row cap or
+    the flush timeout trips. Failed flushes are logged and dropped, the
+    same tolerance the inline RELATE calls had for pre-existing edges.
+    """
+
+    def __init__(
+        self,
+        db_client: SurrealDBClient,
+        max_rows: int = _DEFAULT_MAX_ROWS,
+        flush_interval: float = _DEFAULT_FLUSH_INTERVAL
+    ):
+        """
+        Initialize sender and start its worker thread
+
+        Args:
+            db_client: SurrealDB client
+            max_rows: Pending-edge count that triggers a flush
+            flush_interval: Seconds after the first pending edge before
+                a flush triggers regardless of count
+        """
+        self.db = db_client
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def send(self, relation_table: str, from_record: str, to_record: str) -> None:
+        """Queue one edge for background insertion"""
+        self._queue.put((relation_table, from_record, to_record))
+
+    def send_many(self, relation_table: str, pairs: List[Tuple[str, str]]) -> None:
+        """Queue many edges of one relation for background insertion"""
+        for from_record, to_record in pairs:
+            self._queue.put((relation_table, from_record, to_record))
+
+    def drain(self) -> None:
+        """Block until every edge queued so far has been flushed"""
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        flushed.wait()
+
+    def close(self) -> None:
+        """Flush remaining edges and stop the worker thread"""
+        self._queue.put(_SENTINEL)
+        self._worker.join()
+
+    def _run(self) -> None:
+        pending: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        count = 0
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(pending)
+                count, deadline = 0, None
+                continue
+
+            if item is _SENTINEL:
+                self._flush(pending)
+                return
+
+            if isinstance(item, threading.Event):
+                self._flush(pending)
+                count, deadline = 0, None
+                item.set()
+                continue
+
+            relation_table, from_record, to_record = item
+            pending[relation_table].append((from_record, to_record))
+            count += 1
+            if deadline is None:
+                deadline = monotonic() + self.flush_interval
+            if count >= self.max_rows:
+                self._flush(pending)
+                count, deadline = 0, None
+
+    def _flush(self, pending: Dict[str, List[Tuple[str, str]]]) -> None:
+        for relation_table, pairs in pending.items():
+            try:
+                self.db.relate_many(relation_table, pairs)
+            except Exception as e:
+                logger.error("Error flushing %d %s edges: %s", len(pairs), relation_table, e)
+        pending.clear()
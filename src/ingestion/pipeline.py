@@ -2,12 +2,22 @@
 Main ingestion pipeline
 Orchestrates email extraction, enrichment, embedding, and storage
 """
-from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import numpy as np
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import permutations
+from typing import Dict, Any, Iterable, List, Optional
 from datetime import datetime
 
 from src.db.connection import SurrealDBClient
 from src.embeddings.generator import EmbeddingGenerator
+from src.ingestion.graph_edge_sender import GraphEdgeSender
 from src.ingestion.metadata_enricher import MetadataEnricher
+from src.rag.tags import tags_to_mask
+
+logger = logging.getLogger(__name__)
 
 
 class IngestionPipeline:
@@ -17,7 +27,8 @@ class IngestionPipeline:
         self,
         db_client: SurrealDBClient,
         embedding_gen: EmbeddingGenerator,
-        metadata_enricher: MetadataEnricher
+        metadata_enricher: MetadataEnricher,
+        quantize_embeddings: bool = False
     ):
         """
         Initialize pipeline
@@ -26,10 +37,57 @@ class IngestionPipeline:
             db_client: SurrealDB client
             embedding_gen: Embedding generator
             metadata_enricher: Metadata enricher
+            quantize_embeddings: Store embeddings as int8 (SQ8) instead
+                of float32
         """
         self.db = db_client
         self.embedding_gen = embedding_gen
         self.enricher = metadata_enricher
+        self.quantize_embeddings = quantize_embeddings
+
+        # Graph edges are queued here and written in bulk off-thread;
+        # created lazily so pipelines that never build relations don't
+        # own a worker thread
+        self._edge_sender: Optional[GraphEdgeSender] = None
+
+    @property
+    def edge_sender(self) -> GraphEdgeSender:
+        if self._edge_sender is None:
+            self._edge_sender = GraphEdgeSender(self.db)
+        return self._edge_sender
+
+    def close(self) -> None:
+        """Flush pending graph edges and stop the background writer"""
+        if self._edge_sender is not None:
+            self._edge_sender.close()
+            self._edge_sender = None
+
+    @staticmethod
+    def _quantize_sq8(embedding) -> np.ndarray:
+        """Scalar-quantize an embedding to int8
+
+        Each component is scaled so the largest magnitude maps to 127
+        and rounded to int8. Cosine similarity is scale-invariant, so
+        searches against the quantized vector need no dequantization or
+        stored scale factor — the payoff is that int8 components
+        serialize to 1-4 JSON characters instead of 10+ for a float32,
+        cutting the embedding's share of every insert roughly 4x.
+        """
+        vec = np.asarray(embedding, dtype=np.float32)
+        peak = np.abs(vec).max()
+        if peak == 0.0:
+            return np.zeros(vec.shape, dtype=np.int8)
+        return np.round(vec * (127.0 / peak)).astype(np.int8)
+
+    @staticmethod
+    def _normalize_address(address: str) -> str:
+        """Canonical form of an email address for entity resolution
+
+        Case and stray whitespace vary across From: headers for the same
+        person; resolving people on the raw string splits one sender
+        across several person records and their involves edges.
+        """
+        return address.strip().lower()
 
     def ingest_email(self, email_data: Dict[str, Any]) -> str:
         """
@@ -50,15 +108,39 @@ class IngestionPipeline:
         embedding = self.embedding_gen.generate_for_email(subject, body)
 
         # Step 3: Prepare data for insertion
-        email_record = {
-            "subject": subject,
-            "body": body,
+        email_record = self._build_email_record(enriched, embedding)
+
+        # Step 4: Insert into database
+        result = self.db.create("email", email_record)
+
+        email_id = result.get("id")
+        logger.debug("Inserted email: %s", email_id)
+
+        return email_id
+
+    def _build_email_record(
+        self,
+        enriched: Dict[str, Any],
+        embedding,
+        default_date: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the email row to insert from enriched data + embedding
+
+        default_date lets batch callers format the fallback timestamp
+        once per batch instead of once per record; SurrealDB casts the
+        ISO string to a datetime on write.
+        """
+        if self.quantize_embeddings:
+            embedding = self._quantize_sq8(embedding)
+        return {
+            "subject": enriched.get("subject", ""),
+            "body": enriched.get("body", ""),
             "body_embedding": embedding,
             "sender_email": enriched.get("sender_email", ""),
             "sender_name": enriched.get("sender_name", ""),
             "recipients": enriched.get("recipients", []),
             "cc": enriched.get("cc", []),
-            "date": enriched.get("date", datetime.now().isoformat()),
+            "date": enriched.get("date") or default_date or datetime.now().isoformat(),
             "thread_id": enriched.get("thread_id", ""),
             "message_id": enriched.get("message_id", ""),
             "in_reply_to": enriched.get("in_reply_to"),
@@ -67,21 +149,62 @@ class IngestionPipeline:
             "dossier_id": enriched.get("dossier_id"),
             "priority": enriched.get("priority"),
             "tags": enriched.get("tags", []),
+            "tags_mask": tags_to_mask(enriched.get("tags", [])),
             "has_attachments": enriched.get("has_attachments", False),
             "language": enriched.get("language", "fr")
         }
 
-        # Step 4: Insert into database
-        result = self.db.create("email", email_record)
+    def ingest_emails_bulk(self, emails: List[Dict[str, Any]]) -> List[str]:
+        """
+        Ingest multiple emails with one embedding call and one INSERT
 
-        email_id = result.get("id")
-        print(f"Inserted email: {email_id}")
+        Args:
+            emails: List of raw email data
 
-        return email_id
+        Returns:
+            List of inserted email IDs, in input order
+        """
+        if not emails:
+            return []
+
+        # Enrich everything first
+        enriched_emails = self.enricher.enrich_batch(emails)
+
+        # One batched embedding call for the whole set
+        subjects = [e.get("subject", "") for e in enriched_emails]
+        bodies = [e.get("body", "") for e in enriched_emails]
+        embeddings = self.embedding_gen.generate_for_emails(subjects, bodies)
+
+        # One INSERT statement for all records
+        now_iso = datetime.now().isoformat()
+        records = [
+            self._build_email_record(enriched, embedding, default_date=now_iso)
+            for enriched, embedding in zip(enriched_emails, embeddings)
+        ]
+        created = self.db.create_many("email", records)
+
+        return [record.get("id") for record in created]
+
+    def _process_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Enrich and embed a batch, returning the rows to insert"""
+        enriched_batch = self.enricher.enrich_batch(batch)
+        subjects = [e.get("subject", "") for e in enriched_batch]
+        bodies = [e.get("body", "") for e in enriched_batch]
+        embeddings = self.embedding_gen.generate_for_emails(subjects, bodies)
+        now_iso = datetime.now().isoformat()
+        return [
+            self._build_email_record(enriched, embedding, default_date=now_iso)
+            for enriched, embedding in zip(enriched_batch, embeddings)
+        ]
 
     def ingest_batch(self, emails: List[Dict[str, Any]], batch_size: int = 10) -> List[str]:
         """
-        Ingest multiple emails in batches
+        Ingest multiple emails in pipelined batches
+
+        Emails are processed batch_size at a time; while one batch's
+        INSERT is in flight on a writer thread, the next batch is
+        already being enriched and embedded, so DB round-trips hide
+        behind embedding compute instead of serializing with it.
 
         Args:
             emails: List of raw email data
@@ -92,21 +215,97 @@ class IngestionPipeline:
         """
         email_ids = []
 
-        print(f"Ingesting {len(emails)} emails...")
+        logger.info("Ingesting %d emails...", len(emails))
 
-        for i, email_data in enumerate(emails, 1):
+        def collect(write: Future) -> None:
             try:
-                email_id = self.ingest_email(email_data)
-                email_ids.append(email_id)
+                created = write.result()
+                email_ids.extend(record.get("id") for record in created)
+            except Exception as e:
+                logger.error("Error inserting batch: %s", e)
 
-                if i % batch_size == 0:
-                    print(f"Progress: {i}/{len(emails)} emails ingested")
+        pending_write = None
+        with ThreadPoolExecutor(max_workers=1) as db_writer:
+            for start in range(0, len(emails), batch_size):
+                batch = emails[start:start + batch_size]
 
-            except Exception as e:
-                print(f"Error ingesting email {i}: {e}")
-                continue
+                try:
+                    records = self._process_batch(batch)
+                except Exception as e:
+                    logger.error("Error processing batch at %d: %s", start, e)
+                    continue
+
+                if pending_write is not None:
+                    collect(pending_write)
+
+                pending_write = db_writer.submit(self.db.create_many, "email", records)
+                logger.info("Progress: %d/%d emails processed", min(start + batch_size, len(emails)), len(emails))
+
+            if pending_write is not None:
+                collect(pending_write)
+
+        logger.info("Completed: %d emails ingested successfully", len(email_ids))
+        return email_ids
+
+    async def ingest_stream(
+        self,
+        emails: Iterable[Dict[str, Any]],
+        batch_size: int = 10,
+        max_pending: int = 4
+    ) -> List[str]:
+        """
+        Ingest emails from an iterator without materializing them all
+
+        Three stages — batching the source, enrich+embed, DB write —
+        run as tasks connected by bounded queues, so at most
+        max_pending batches exist at once (a large mailbox never sits
+        in memory) while each stage's work overlaps the others', like
+        ingest_batch's writer thread but for sources of unknown size.
+
+        Args:
+            emails: Iterable of raw email data (e.g. a mailbox reader)
+            batch_size: Emails per enrich/embed/insert batch
+            max_pending: Max batches buffered between stages
+
+        Returns:
+            List of inserted email IDs, in input order
+        """
+        batches: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        records_queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        email_ids: List[str] = []
+
+        async def produce():
+            batch = []
+            for email_data in emails:
+                batch.append(email_data)
+                if len(batch) >= batch_size:
+                    await batches.put(batch)
+                    batch = []
+            if batch:
+                await batches.put(batch)
+            await batches.put(None)
+
+        async def embed():
+            while (batch := await batches.get()) is not None:
+                try:
+                    records = await asyncio.to_thread(self._process_batch, batch)
+                except Exception as e:
+                    logger.error("Error processing batch: %s", e)
+                    continue
+                await records_queue.put(records)
+            await records_queue.put(None)
+
+        async def write():
+            while (records := await records_queue.get()) is not None:
+                try:
+                    created = await asyncio.to_thread(self.db.create_many, "email", records)
+                    email_ids.extend(record.get("id") for record in created)
+                except Exception as e:
+                    logger.error("Error inserting batch: %s", e)
+
+        await asyncio.gather(produce(), embed(), write())
 
-        print(f"Completed: {len(email_ids)} emails ingested successfully")
+        logger.info("Completed: %d emails ingested successfully", len(email_ids))
         return email_ids
 
     def build_graph_relations(self, email_ids: Optional[List[str]] = None):
@@ -116,18 +315,43 @@ class IngestionPipeline:
         Args:
             email_ids: Specific email IDs to process, or None for all
         """
-        print("Building graph relations...")
+        logger.info("Building graph relations...")
 
-        # Get emails to process
+        # Get emails to process — one query for the whole id set rather
+        # than a round-trip per id
         if email_ids:
-            emails = []
-            for email_id in email_ids:
-                email = self.db.select("email", email_id.split(':')[1])
-                if email:
-                    emails.extend(email)
+            ids_str = ", ".join(email_ids)
+            results = self.db.query(f"SELECT * FROM email WHERE id IN [{ids_str}];")
+            emails = results[0].get("result") or [] if results else []
         else:
             emails = self.db.select("email")
 
+        # Create the sender up front: the phase threads below would
+        # otherwise race the lazy init and a double-create leaks a
+        # second worker whose edges the final drain() never sees
+        sender = self.edge_sender
+
+        # The four relation types read the same email set but write
+        # disjoint tables, so their (bulk) round-trips can overlap on a
+        # thread pool instead of serializing
+        phases = (
+            self._build_thread_relations,
+            self._build_reply_relations,
+            self._build_person_relations,
+            self._build_dossier_relations,
+        )
+        with ThreadPoolExecutor(max_workers=len(phases)) as pool:
+            for future in [pool.submit(phase, emails) for phase in phases]:
+                future.result()
+
+        # Wait for the background writer so callers (and the API's
+        # background task) observe a fully built graph on return
+        sender.drain()
+
+        logger.info("Graph relations built successfully!")
+
+    def _build_thread_relations(self, emails: List[Dict[str, Any]]) -> None:
+        """Relate every email in a thread to its other members"""
         # Build thread relations
         threads = {}
         for email in emails:
@@ -137,141 +361,168 @@ class IngestionPipeline:
                     threads[thread_id] = []
                 threads[thread_id].append(email.get("id"))
 
-        # Create thread_member relations
-        for thread_id, email_ids_in_thread in threads.items():
-            for email_id in email_ids_in_thread:
-                for other_email_id in email_ids_in_thread:
-                    if email_id != other_email_id:
-                        try:
-                            self.db.relate(email_id, "thread_member", other_email_id)
-                        except:
-                            pass  # Relation may already exist
+        # Create thread_member relations — all edges in one bulk call
+        # instead of a round-trip per pair. The graph traversals only
+        # follow outgoing thread_member edges, so both directions of
+        # each pair are emitted (permutations, not combinations).
+        thread_pairs = [
+            pair
+            for email_ids_in_thread in threads.values()
+            for pair in permutations(email_ids_in_thread, 2)
+        ]
+
+        self.edge_sender.send_many("thread_member", thread_pairs)
+
+        logger.info("Queued thread relations for %d threads", len(threads))
+
+    def _build_reply_relations(self, emails: List[Dict[str, Any]]) -> None:
+        """Relate replies to the emails they answer"""
+        # Build reply relations — resolve message_ids against an
+        # in-memory map instead of one SELECT per email; message_ids
+        # outside the current set are fetched with a single query
+        by_message_id = {
+            email.get("message_id"): email.get("id")
+            for email in emails if email.get("message_id")
+        }
 
-        print(f"Created thread relations for {len(threads)} threads")
+        missing_ids = sorted({
+            email["in_reply_to"] for email in emails
+            if email.get("in_reply_to") and email["in_reply_to"] not in by_message_id
+        })
+        if missing_ids:
+            found = self.db.query(
+                "SELECT id, message_id FROM email WHERE message_id IN $mids;",
+                {"mids": missing_ids}
+            )
+            if found and found[0].get("result"):
+                for row in found[0]["result"]:
+                    by_message_id[row.get("message_id")] = row.get("id")
 
-        # Build reply relations
-        reply_count = 0
+        reply_pairs = []
         for email in emails:
-            in_reply_to = email.get("in_reply_to")
-            if in_reply_to:
-                # Find original email by message_id
-                original_emails = self.db.query(
-                    f"SELECT id FROM email WHERE message_id = '{in_reply_to}' LIMIT 1;"
-                )
-                if original_emails and original_emails[0].get("result"):
-                    original_id = original_emails[0]["result"][0].get("id")
-                    try:
-                        self.db.relate(email.get("id"), "replies_to", original_id)
-                        reply_count += 1
-                    except:
-                        pass
+            original_id = by_message_id.get(email.get("in_reply_to"))
+            if original_id:
+                reply_pairs.append((email.get("id"), original_id))
 
-        print(f"Created {reply_count} reply relations")
+        self.edge_sender.send_many("replies_to", reply_pairs)
 
-        # Build person relations
-        person_cache = {}
+        logger.info("Queued %d reply relations", len(reply_pairs))
 
-        def get_or_create_person(email_addr: str, name: str = "") -> str:
-            """Get or create person record"""
-            if email_addr in person_cache:
-                return person_cache[email_addr]
+    def _build_person_relations(self, emails: List[Dict[str, Any]]) -> None:
+        """Relate emails to the people they involve"""
+        # Build person relations — collect every unique address up
+        # front, find the existing records with one SELECT, create the
+        # missing ones with one INSERT, then bulk-relate
+        all_people = {}
+        for email in emails:
+            sender_email = email.get("sender_email")
+            if sender_email:
+                all_people.setdefault(
+                    self._normalize_address(sender_email), email.get("sender_name", "")
+                )
+            for recipient in email.get("recipients", []):
+                if recipient:
+                    all_people.setdefault(self._normalize_address(recipient), "")
 
-            # Check if person exists
+        person_cache = {}
+        if all_people:
             existing = self.db.query(
-                f"SELECT id FROM person WHERE email = '{email_addr}' LIMIT 1;"
+                "SELECT id, email FROM person WHERE email IN $emails;",
+                {"emails": list(all_people)}
             )
-
             if existing and existing[0].get("result"):
-                person_id = existing[0]["result"][0].get("id")
-            else:
-                # Create person
-                person_data = {
-                    "email": email_addr,
-                    "name": name or email_addr,
-                    "role": "autre"
-                }
-                person = self.db.create("person", person_data)
-                person_id = person.get("id")
-
-            person_cache[email_addr] = person_id
-            return person_id
+                for row in existing[0]["result"]:
+                    person_cache[self._normalize_address(row.get("email", ""))] = row.get("id")
+
+            missing_people = [
+                {"email": addr, "name": name or addr, "role": "autre"}
+                for addr, name in all_people.items()
+                if addr not in person_cache
+            ]
+            if missing_people:
+                created = self.db.create_many("person", missing_people)
+                for row in created:
+                    person_cache[row.get("email")] = row.get("id")
 
         # Create involves relations
-        involves_count = 0
+        involves_pairs = []
         for email in emails:
             email_id = email.get("id")
 
-            # Add sender
             sender_email = email.get("sender_email")
-            sender_name = email.get("sender_name", "")
-            if sender_email:
-                try:
-                    person_id = get_or_create_person(sender_email, sender_name)
-                    self.db.relate(email_id, "involves", person_id)
-                    involves_count += 1
-                except:
-                    pass
+            person_id = person_cache.get(self._normalize_address(sender_email)) if sender_email else None
+            if person_id:
+                involves_pairs.append((email_id, person_id))
 
-            # Add recipients
             for recipient in email.get("recipients", []):
-                try:
-                    person_id = get_or_create_person(recipient)
-                    self.db.relate(email_id, "involves", person_id)
-                    involves_count += 1
-                except:
-                    pass
+                person_id = person_cache.get(self._normalize_address(recipient)) if recipient else None
+                if person_id:
+                    involves_pairs.append((email_id, person_id))
 
-        print(f"Created {involves_count} person involvement relations")
+        self.edge_sender.send_many("involves", involves_pairs)
 
-        # Build dossier relations
-        dossier_cache = {}
-
-        def get_or_create_dossier(dossier_id: str) -> str:
-            """Get or create dossier record"""
-            if dossier_id in dossier_cache:
-                return dossier_cache[dossier_id]
+        logger.info("Queued %d person involvement relations", len(involves_pairs))
 
-            # Check if dossier exists
-            existing = self.db.query(
-                f"SELECT id FROM dossier WHERE id = 'dossier:{dossier_id}' LIMIT 1;"
-            )
+    def _build_dossier_relations(self, emails: List[Dict[str, Any]]) -> None:
+        """Relate emails to their dossiers, creating missing dossiers"""
+        # Build dossier relations — one SELECT for the ids already in
+        # the table, one multi-statement CREATE for the rest
+        dossier_refs = sorted({
+            email["dossier_id"] for email in emails if email.get("dossier_id")
+        })
 
+        dossier_cache = {}
+        if dossier_refs:
+            existing = self.db.query("SELECT id FROM dossier;")
+            existing_ids = set()
             if existing and existing[0].get("result"):
-                doss_id = existing[0]["result"][0].get("id")
-            else:
-                # Create dossier
-                dossier_data = {
-                    "client_name": "",
-                    "description": f"Dossier {dossier_id}"
-                }
-                # Use specific ID
-                dossier = self.db.query(
-                    f"CREATE dossier:{dossier_id} CONTENT {{'client_name': '', 'description': 'Dossier {dossier_id}'}};"
-                )
-                doss_id = f"dossier:{dossier_id}"
-
-            dossier_cache[dossier_id] = doss_id
-            return doss_id
+                existing_ids = {row.get("id") for row in existing[0]["result"]}
+
+            for ref in dossier_refs:
+                for candidate in (f"dossier:{ref}", f"dossier:\u27e8{ref}\u27e9"):
+                    if candidate in existing_ids:
+                        dossier_cache[ref] = candidate
+                        break
+
+            missing_refs = [ref for ref in dossier_refs if ref not in dossier_cache]
+            if missing_refs:
+                statements = []
+                variables = {}
+                for i, ref in enumerate(missing_refs):
+                    statements.append(
+                        f"CREATE type::thing('dossier', $doss_{i}) CONTENT $data_{i};"
+                    )
+                    variables[f"doss_{i}"] = ref
+                    variables[f"data_{i}"] = {
+                        "client_name": "",
+                        "description": f"Dossier {ref}"
+                    }
+                try:
+                    created = self.db.query("\n".join(statements), variables)
+                    for ref, result in zip(missing_refs, created):
+                        rows = result.get("result") or []
+                        if rows:
+                            dossier_cache[ref] = rows[0].get("id")
+                except Exception as e:
+                    logger.error("Error creating dossiers: %s", e)
 
         # Create related_to_case relations
-        case_count = 0
+        case_pairs = []
         for email in emails:
-            dossier_id = email.get("dossier_id")
-            if dossier_id:
-                try:
-                    doss_record_id = get_or_create_dossier(dossier_id)
-                    self.db.relate(email.get("id"), "related_to_case", doss_record_id)
-                    case_count += 1
-                except Exception as e:
-                    print(f"Error creating case relation: {e}")
-                    pass
+            doss_record_id = dossier_cache.get(email.get("dossier_id"))
+            if doss_record_id:
+                case_pairs.append((email.get("id"), doss_record_id))
 
-        print(f"Created {case_count} dossier relations")
-        print("Graph relations built successfully!")
+        self.edge_sender.send_many("related_to_case", case_pairs)
 
+        logger.info("Queued %d dossier relations", len(case_pairs))
 
+
+@lru_cache(maxsize=None)
 def get_ingestion_pipeline() -> IngestionPipeline:
-    """Factory function to create ingestion pipeline"""
+    """Factory function to create ingestion pipeline (shared instance)"""
+    import os
+
     from src.db.connection import get_db_client
     from src.embeddings.generator import get_embedding_generator
     from src.ingestion.metadata_enricher import get_metadata_enricher
@@ -280,4 +531,7 @@ def get_ingestion_pipeline() -> IngestionPipeline:
     embedding_gen = get_embedding_generator()
     enricher = get_metadata_enricher()
 
-    return IngestionPipeline(db_client, embedding_gen, enricher)
+    return IngestionPipeline(
+        db_client, embedding_gen, enricher,
+        quantize_embeddings=os.getenv("EMBEDDING_QUANTIZE", "0") == "1"
+    )
@@ -2,11 +2,16 @@
 RAG Retrieval System
 Combines vector search, metadata filtering, and graph expansion
 """
+import asyncio
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
 
 from src.db.connection import SurrealDBClient
 from src.embeddings.generator import EmbeddingGenerator
+from src.rag.semantic_cache import SemanticCache
 
 
 @dataclass
@@ -39,57 +44,91 @@ class RAGResult:
 class RAGRetriever:
     """Hybrid RAG retrieval system"""
 
-    def __init__(self, db_client: SurrealDBClient, embedding_gen: EmbeddingGenerator):
+    def __init__(
+        self,
+        db_client: SurrealDBClient,
+        embedding_gen: EmbeddingGenerator,
+        semantic_cache: Optional[SemanticCache] = None
+    ):
         """
         Initialize RAG retriever
 
         Args:
             db_client: SurrealDB client
             embedding_gen: Embedding generator
+            semantic_cache: Optional cache serving near-duplicate queries
         """
         self.db = db_client
         self.embedding_gen = embedding_gen
+        self.semantic_cache = semantic_cache
+
+    @staticmethod
+    def _filters_cache_key(filters: Optional[RAGFilters]) -> Optional[tuple]:
+        """Hashable form of the filters for cache parameter tuples"""
+        if not filters:
+            return None
+        return (
+            filters.category, filters.client_id, filters.dossier_id,
+            filters.sender_email, filters.date_from, filters.date_to,
+            tuple(filters.tags) if filters.tags else None
+        )
+
+    def _build_where_clause(self, filters: Optional[RAGFilters]) -> tuple:
+        """Build WHERE clause and bind variables from filters
+
+        Filter values are bound as $variables rather than interpolated,
+        so the query text stays constant across calls (parse-cache
+        friendly) and user-supplied values cannot alter the query.
 
-    def _build_where_clause(self, filters: Optional[RAGFilters]) -> str:
-        """Build WHERE clause from filters"""
+        Returns:
+            Tuple of (where_clause, variables)
+        """
         if not filters:
-            return ""
+            return "", {}
 
         conditions = []
+        variables: Dict[str, Any] = {}
 
         if filters.category:
-            conditions.append(f"category = '{filters.category}'")
+            conditions.append("category = $category")
+            variables["category"] = filters.category
 
         if filters.client_id:
-            conditions.append(f"client_id = '{filters.client_id}'")
+            conditions.append("client_id = $client_id")
+            variables["client_id"] = filters.client_id
 
         if filters.dossier_id:
-            conditions.append(f"dossier_id = '{filters.dossier_id}'")
+            conditions.append("dossier_id = $dossier_id")
+            variables["dossier_id"] = filters.dossier_id
 
         if filters.sender_email:
-            conditions.append(f"sender_email = '{filters.sender_email}'")
+            conditions.append("sender_email = $sender_email")
+            variables["sender_email"] = filters.sender_email
 
         if filters.date_from:
-            conditions.append(f"date >= '{filters.date_from}'")
+            conditions.append("date >= $date_from")
+            variables["date_from"] = filters.date_from
 
         if filters.date_to:
-            conditions.append(f"date <= '{filters.date_to}'")
+            conditions.append("date <= $date_to")
+            variables["date_to"] = filters.date_to
 
         if filters.tags:
             # Check if any tag is present
-            tag_conditions = [f"'{tag}' IN tags" for tag in filters.tags]
-            conditions.append(f"({' OR '.join(tag_conditions)})")
+            conditions.append("tags CONTAINSANY $tags")
+            variables["tags"] = filters.tags
 
         if conditions:
-            return "WHERE " + " AND ".join(conditions)
+            return "WHERE " + " AND ".join(conditions), variables
 
-        return ""
+        return "", {}
 
-    def vector_search(
+    async def vector_search(
         self,
         query: str,
         top_k: int = 10,
-        filters: Optional[RAGFilters] = None
+        filters: Optional[RAGFilters] = None,
+        body_limit: Optional[int] = None
     ) -> List[RAGResult]:
         """
         Perform pure vector similarity search
@@ -98,20 +137,31 @@ class RAGRetriever:
             query: Search query
             top_k: Number of results
             filters: Optional metadata filters
+            body_limit: Truncate bodies to this many chars DB-side
 
         Returns:
             List of RAG results
         """
-        # Generate query embedding
-        query_embedding = self.embedding_gen.generate(query)
+        # Generate query embedding off the event loop — a cache miss is
+        # a synchronous HTTP round-trip that would stall every other
+        # request in this worker
+        query_embedding = await asyncio.to_thread(self.embedding_gen.generate, query)
+
+        # Near-duplicate queries are answered from the semantic cache
+        cache_params = ("vector", top_k, self._filters_cache_key(filters), body_limit)
+        if self.semantic_cache is not None:
+            cached = self.semantic_cache.lookup(query_embedding, cache_params)
+            if cached is not None:
+                return cached
 
         # Search with vector similarity
-        results = self.db.vector_search(
+        results = await self.db.avector_search(
             table="email",
             field="body_embedding",
             embedding=query_embedding,
             limit=top_k,
-            filters=self._filters_to_dict(filters) if filters else None
+            filters=self._filters_to_dict(filters) if filters else None,
+            body_limit=body_limit
         )
 
         # Convert to RAG results
@@ -130,6 +180,9 @@ class RAGRetriever:
                 dossier_id=result.get("dossier_id")
             ))
 
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(query_embedding, cache_params, rag_results)
+
         return rag_results
 
     def _filters_to_dict(self, filters: RAGFilters) -> Dict[str, Any]:
@@ -147,7 +200,7 @@ class RAGRetriever:
 
         return filter_dict
 
-    def graph_expand_threads(self, email_ids: List[str]) -> List[Dict[str, Any]]:
+    async def graph_expand_threads(self, email_ids: List[str]) -> List[Dict[str, Any]]:
         """
         Expand search results with emails from same threads
 
@@ -167,7 +220,7 @@ class RAGRetriever:
         SELECT ->thread_member->email.* AS related FROM email WHERE id IN [{email_ids_str}];
         """
 
-        results = self.db.query(query)
+        results = await self.db.aquery(query)
 
         related_emails = []
         if results and results[0].get("result"):
@@ -179,7 +232,7 @@ class RAGRetriever:
 
         return related_emails
 
-    def graph_expand_cases(self, email_ids: List[str], limit: int = 3) -> List[Dict[str, Any]]:
+    async def graph_expand_cases(self, email_ids: List[str], limit: int = 3) -> List[Dict[str, Any]]:
         """
         Expand search results with emails from same dossiers
 
@@ -199,7 +252,7 @@ class RAGRetriever:
         SELECT ->related_to_case->dossier<-related_to_case<-email.* AS related FROM email WHERE id IN [{email_ids_str}];
         """
 
-        results = self.db.query(query)
+        results = await self.db.aquery(query)
 
         related_emails = []
         if results and results[0].get("result"):
@@ -211,7 +264,7 @@ class RAGRetriever:
 
         return related_emails[:limit * len(email_ids)]
 
-    def graph_expand_people(self, email_ids: List[str], limit: int = 5) -> List[Dict[str, Any]]:
+    async def graph_expand_people(self, email_ids: List[str], limit: int = 5) -> List[Dict[str, Any]]:
         """
         Expand search results with emails involving same people
 
@@ -231,7 +284,7 @@ class RAGRetriever:
         SELECT ->involves->person<-involves<-email.* AS related FROM email WHERE id IN [{email_ids_str}];
         """
 
-        results = self.db.query(query)
+        results = await self.db.aquery(query)
 
         related_emails = []
         if results and results[0].get("result"):
@@ -243,7 +296,112 @@ class RAGRetriever:
 
         return related_emails[:limit * len(email_ids)]
 
-    def hybrid_search(
+    async def _graph_expand_fused(
+        self,
+        email_ids: List[str],
+        expand_threads: bool,
+        expand_cases: bool,
+        expand_people: bool
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Run the requested graph expansions in a single query
+
+        The three traversals share the same root set, so fusing them
+        into one SELECT lets the database reuse the id scan and turns up
+        to three round-trips into one.
+
+        Returns:
+            Dict mapping context type to the list of related emails
+        """
+        alias_by_context = {
+            "thread_member": "->thread_member->email.* AS threads",
+            "same_case": "->related_to_case->dossier<-related_to_case<-email.* AS cases",
+            "same_person": "->involves->person<-involves<-email.* AS people",
+        }
+
+        expanded: Dict[str, List[Dict[str, Any]]] = {}
+        if expand_threads:
+            expanded["thread_member"] = []
+        if expand_cases:
+            expanded["same_case"] = []
+        if expand_people:
+            expanded["same_person"] = []
+
+        if not email_ids or not expanded:
+            return expanded
+
+        email_ids_str = ", ".join([f"'{eid}'" for eid in email_ids])
+        projections = ", ".join(alias_by_context[context] for context in expanded)
+
+        query = f"""
+        SELECT {projections} FROM email WHERE id IN [{email_ids_str}];
+        """
+
+        results = await self.db.aquery(query)
+
+        aliases = {"thread_member": "threads", "same_case": "cases", "same_person": "people"}
+        if results and results[0].get("result"):
+            for item in results[0]["result"]:
+                for context_type, related in expanded.items():
+                    for email in item.get(aliases[context_type]) or []:
+                        if email:
+                            related.append(email)
+
+        return expanded
+
+    @staticmethod
+    def _rerank_expanded(
+        candidates: List[tuple],
+        query_embedding
+    ) -> List[tuple]:
+        """
+        Order expanded candidates by similarity to the query
+
+        Graph expansion returns emails in traversal order, which says
+        nothing about relevance. The stored body_embeddings come back
+        with the expansion rows, so all candidates are scored with one
+        matrix product against the query embedding instead of a Python
+        dot product per row. Rows are normalized first, so cosine
+        reduces to a dot and int8-quantized embeddings score the same
+        as their float originals.
+
+        Args:
+            candidates: List of (email_dict, context_type) tuples
+            query_embedding: Query embedding vector
+
+        Returns:
+            (email_dict, context_type, score) tuples, best first
+        """
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q_norm = np.linalg.norm(q)
+        if q_norm:
+            q = q / q_norm
+
+        scored = []
+        unscored = []
+        vectors = []
+        for email, context_type in candidates:
+            embedding = email.get("body_embedding")
+            if embedding and len(embedding) == q.shape[0]:
+                scored.append((email, context_type))
+                vectors.append(embedding)
+            else:
+                unscored.append((email, context_type, 0.0))
+
+        if not scored:
+            return unscored
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        scores = (matrix / norms) @ q
+
+        order = np.argsort(-scores)
+        return [
+            (scored[i][0], scored[i][1], float(scores[i])) for i in order
+        ] + unscored
+
+    async def hybrid_search(
         self,
         query: str,
         top_k: int = 5,
@@ -252,7 +410,8 @@ class RAGRetriever:
         expand_threads: bool = True,
         expand_cases: bool = True,
         expand_people: bool = False,
-        max_results: int = 20
+        max_results: int = 20,
+        body_limit: Optional[int] = None
     ) -> List[RAGResult]:
         """
         Hybrid RAG search: Vector search + Graph expansion
@@ -266,67 +425,82 @@ class RAGRetriever:
             expand_cases: Include same dossier emails
             expand_people: Include emails with same people
             max_results: Maximum total results
+            body_limit: Truncate result bodies to this many chars DB-side
 
         Returns:
             List of RAG results, ranked by relevance
         """
+        cache_params = (
+            "hybrid", top_k, self._filters_cache_key(filters), expand_graph,
+            expand_threads, expand_cases, expand_people, max_results, body_limit
+        )
+        if self.semantic_cache is not None:
+            query_embedding = await asyncio.to_thread(self.embedding_gen.generate, query)
+            cached = self.semantic_cache.lookup(query_embedding, cache_params)
+            if cached is not None:
+                return cached
+
         # Step 1: Vector search
-        vector_results = self.vector_search(query, top_k, filters)
+        vector_results = await self.vector_search(query, top_k, filters, body_limit)
 
         if not expand_graph:
             return vector_results[:max_results]
 
-        # Step 2: Graph expansion
+        # Step 2: Graph expansion — one fused query for all traversals
         email_ids = [r.email_id for r in vector_results]
-        expanded_emails = []
-        seen_ids = set(email_ids)
+        expanded = await self._graph_expand_fused(
+            email_ids, expand_threads, expand_cases, expand_people
+        )
 
-        # Expand threads
-        if expand_threads:
-            thread_emails = self.graph_expand_threads(email_ids)
-            for email in thread_emails:
-                eid = email.get("id")
-                if eid and eid not in seen_ids:
-                    expanded_emails.append((email, "thread_member"))
-                    seen_ids.add(eid)
-
-        # Expand cases
-        if expand_cases:
-            case_emails = self.graph_expand_cases(email_ids, limit=3)
-            for email in case_emails:
-                eid = email.get("id")
-                if eid and eid not in seen_ids:
-                    expanded_emails.append((email, "same_case"))
-                    seen_ids.add(eid)
-
-        # Expand people
-        if expand_people:
-            people_emails = self.graph_expand_people(email_ids, limit=2)
-            for email in people_emails:
-                eid = email.get("id")
-                if eid and eid not in seen_ids:
-                    expanded_emails.append((email, "same_person"))
-                    seen_ids.add(eid)
-
-        # Step 3: Convert expanded emails to RAG results
-        for email, context_type in expanded_emails:
-            vector_results.append(RAGResult(
-                email_id=email.get("id", ""),
-                subject=email.get("subject", ""),
-                body=email.get("body", ""),
-                sender_email=email.get("sender_email", ""),
-                sender_name=email.get("sender_name", ""),
-                date=email.get("date", ""),
-                similarity_score=0.0,  # No direct similarity
-                context_type=context_type,
-                category=email.get("category"),
-                dossier_id=email.get("dossier_id")
-            ))
+        # Keep the per-type caps the separate queries applied
+        if "same_case" in expanded:
+            expanded["same_case"] = expanded["same_case"][:3 * len(email_ids)]
+        if "same_person" in expanded:
+            expanded["same_person"] = expanded["same_person"][:2 * len(email_ids)]
+
+        # Dedup the expanded candidates across traversal types
+        candidates = []
+        seen_ids = set(email_ids)
+        budget = max_results - len(vector_results)
+
+        if budget > 0:
+            for context_type, emails in expanded.items():
+                for email in emails:
+                    eid = email.get("id")
+                    if eid and eid not in seen_ids:
+                        candidates.append((email, context_type))
+                        seen_ids.add(eid)
+
+        # Step 3: Rerank candidates against the query embedding and
+        # keep the best ones that fit the budget — traversal order
+        # alone would keep arbitrary candidates
+        if candidates:
+            reranked = self._rerank_expanded(
+                candidates, await asyncio.to_thread(self.embedding_gen.generate, query)
+            )
+            for email, context_type, score in reranked[:budget]:
+                vector_results.append(RAGResult(
+                    email_id=email.get("id", ""),
+                    subject=email.get("subject", ""),
+                    body=email.get("body", ""),
+                    sender_email=email.get("sender_email", ""),
+                    sender_name=email.get("sender_name", ""),
+                    date=email.get("date", ""),
+                    similarity_score=score,
+                    context_type=context_type,
+                    category=email.get("category"),
+                    dossier_id=email.get("dossier_id")
+                ))
 
         # Step 4: Limit results
-        return vector_results[:max_results]
+        final_results = vector_results[:max_results]
 
-    def search_by_metadata_only(
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(query_embedding, cache_params, final_results)
+
+        return final_results
+
+    async def search_by_metadata_only(
         self,
         filters: RAGFilters,
         limit: int = 20,
@@ -343,16 +517,16 @@ class RAGRetriever:
         Returns:
             List of RAG results
         """
-        where_clause = self._build_where_clause(filters)
+        where_clause, variables = self._build_where_clause(filters)
 
         query = f"""
         SELECT * FROM email
         {where_clause}
         ORDER BY {order_by}
-        LIMIT {limit};
+        LIMIT {int(limit)};
         """
 
-        results = self.db.query(query)
+        results = await self.db.aquery(query, variables)
 
         if not results or not results[0].get("result"):
             return []
@@ -375,12 +549,16 @@ class RAGRetriever:
         return rag_results
 
 
+@lru_cache(maxsize=None)
 def get_rag_retriever() -> RAGRetriever:
-    """Factory function to create RAG retriever"""
+    """Factory function to create RAG retriever (shared instance)"""
+    import os
+
     from src.db.connection import get_db_client
     from src.embeddings.generator import get_embedding_generator
 
     db_client = get_db_client()
     embedding_gen = get_embedding_generator()
+    semantic_cache = SemanticCache() if os.getenv("RAG_SEMANTIC_CACHE", "1") != "0" else None
 
-    return RAGRetriever(db_client, embedding_gen)
+    return RAGRetriever(db_client, embedding_gen, semantic_cache=semantic_cache)
@@ -0,0 +1,113 @@
+"""
+Semantic query-result cache
+Serves cached results for queries whose embeddings nearly match a prior query
+"""
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+# Cosine similarity a new query must reach against a cached query to
+# count as the same question
+_DEFAULT_THRESHOLD = 0.97
+
+# Kept equal to the API's QueryResultCache TTL: both caches are per
+# process, so under multiple uvicorn workers an ingest only flushes the
+# worker that served it and the TTL bounds how long siblings serve
+# stale results
+_DEFAULT_TTL_SECONDS = 300.0
+_DEFAULT_MAX_ENTRIES = 512
+
+
+class SemanticCache:
+    """Cache search results keyed by query-embedding similarity
+
+    Paraphrased queries ("dernier email de Martin" / "le dernier mail du
+    client Martin") embed to nearly identical vectors. Lookups match the
+    incoming query embedding against all cached query vectors with one
+    numpy matrix product and return the stored results when the best
+    match clears the similarity threshold and carries the same search
+    parameters, skipping the vector search and graph expansion entirely.
+    """
+
+    def __init__(
+        self,
+        threshold: float = _DEFAULT_THRESHOLD,
+        ttl_seconds: float = _DEFAULT_TTL_SECONDS,
+        max_entries: int = _DEFAULT_MAX_ENTRIES
+    ):
+        """
+        Initialize semantic cache
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl_seconds: Entry lifetime
+            max_entries: Entry count at which the cache is flushed
+        """
+        self.threshold = threshold
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+        # (N, D) matrix of L2-normalized cached query embeddings, with
+        # (timestamp, params, results) rows parallel to it
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Tuple[float, tuple, Any]] = []
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, embedding, params: tuple) -> Optional[Any]:
+        """
+        Find cached results for a near-identical prior query
+
+        Args:
+            embedding: Query embedding
+            params: Search parameters that must match exactly
+
+        Returns:
+            Cached results, or None on miss
+        """
+        vec = self._normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vec.shape[0]:
+                return None
+
+            scores = self._vectors @ vec
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                timestamp, entry_params, results = self._entries[i]
+                if entry_params == params and now - timestamp <= self._ttl:
+                    return results
+
+        return None
+
+    def store(self, embedding, params: tuple, results: Any) -> None:
+        """Cache the results for a query embedding"""
+        vec = self._normalize(embedding)
+
+        with self._lock:
+            if len(self._entries) >= self._max_entries:
+                self._vectors = None
+                self._entries.clear()
+
+            if self._vectors is None:
+                self._vectors = vec[np.newaxis, :]
+            else:
+                if self._vectors.shape[1] != vec.shape[0]:
+                    return
+                self._vectors = np.vstack([self._vectors, vec])
+            self._entries.append((time.monotonic(), params, results))
+
+    def clear(self) -> None:
+        """Drop all entries (call after ingesting new emails)"""
+        with self._lock:
+            self._vectors = None
+            self._entries.clear()
@@ -0,0 +1,34 @@
+"""
+Tag bitmask encoding
+Maps the enricher's tag vocabulary to bits of one integer per email
+"""
+from typing import Iterable, List
+
+# Bit per tag, in the enricher's _TAG_KEYWORDS order. Append new tags
+# at the end — reassigning bits invalidates every stored mask.
+TAG_BITS = {
+    "urgence": 1 << 0,
+    "rendez-vous": 1 << 1,
+    "expertise": 1 << 2,
+    "tribunal": 1 << 3,
+    "délai": 1 << 4,
+    "paiement": 1 << 5,
+    "contrat": 1 << 6,
+    "accident": 1 << 7,
+    "préjudice": 1 << 8,
+}
+
+_TAGS_BY_BIT = {bit: tag for tag, bit in TAG_BITS.items()}
+
+
+def tags_to_mask(tags: Iterable[str]) -> int:
+    """Encode a tag list as a bitmask; unknown tags are ignored"""
+    mask = 0
+    for tag in tags:
+        mask |= TAG_BITS.get(tag, 0)
+    return mask
+
+
+def mask_to_tags(mask: int) -> List[str]:
+    """Decode a bitmask back to its tag list, in TAG_BITS order"""
+    return [tag for tag, bit in TAG_BITS.items() if mask & bit]
@@ -138,6 +138,9 @@ def main():
         pipeline.build_graph_relations(email_ids)
         print("✓ Relations graphe construites\n")
 
+        # Stop the background edge writer
+        pipeline.close()
+
         print("=== Test terminé avec succès! ===")
         print(f"\nEmails ingérés:")
         for i, email_id in enumerate(email_ids, 1):
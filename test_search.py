@@ -2,72 +2,71 @@
 Test script for RAG search
 Tests various search scenarios
 """
+import asyncio
 import sys
+
 from src.rag.retriever import get_rag_retriever, RAGFilters
 
 
-def print_results(results, query):
-    """Pretty print search results"""
-    print(f"\n{'='*80}")
-    print(f"Query: {query}")
-    print(f"Found {len(results)} results")
-    print('='*80)
+def print_results(results, query, title=None):
+    """Pretty print search results
+
+    Builds the whole block and writes it with one call instead of a
+    print() per line, so a result set costs one syscall and the block
+    hits stdout atomically.
+    """
+    out = []
+    if title:
+        out.append("\n" + "="*80)
+        out.append(title)
+        out.append("="*80)
+    out.append(f"\n{'='*80}")
+    out.append(f"Query: {query}")
+    out.append(f"Found {len(results)} results")
+    out.append('='*80)
 
     for i, result in enumerate(results, 1):
-        print(f"\n[{i}] {result.subject}")
-        print(f"    From: {result.sender_name} <{result.sender_email}>")
-        print(f"    Date: {result.date}")
-        print(f"    Similarity: {result.similarity_score:.3f}")
-        print(f"    Context: {result.context_type}")
+        out.append(f"\n[{i}] {result.subject}")
+        out.append(f"    From: {result.sender_name} <{result.sender_email}>")
+        out.append(f"    Date: {result.date}")
+        out.append(f"    Similarity: {result.similarity_score:.3f}")
+        out.append(f"    Context: {result.context_type}")
         if result.category:
-            print(f"    Category: {result.category}")
+            out.append(f"    Category: {result.category}")
         if result.dossier_id:
-            print(f"    Dossier: {result.dossier_id}")
-        print(f"    Body: {result.body[:150]}...")
+            out.append(f"    Dossier: {result.dossier_id}")
+        out.append(f"    Body: {result.body[:150]}...")
 
+    sys.stdout.write('\n'.join(out) + '\n')
 
-def test_basic_search(retriever):
-    """Test basic vector search"""
-    print("\n" + "="*80)
-    print("TEST 1: Recherche sémantique basique")
-    print("="*80)
 
+async def test_basic_search(retriever):
+    """Test basic vector search"""
     query = "Quelles sont les nouvelles de l'expertise médicale?"
-    results = retriever.vector_search(query, top_k=5)
-    print_results(results, query)
+    results = await retriever.vector_search(query, top_k=5)
+    print_results(results, query, title="TEST 1: Recherche sémantique basique")
 
 
-def test_filtered_search(retriever):
+async def test_filtered_search(retriever):
     """Test search with filters"""
-    print("\n" + "="*80)
-    print("TEST 2: Recherche filtrée par catégorie")
-    print("="*80)
-
     query = "rapport"
     filters = RAGFilters(category="expert_medical")
-    results = retriever.vector_search(query, top_k=5, filters=filters)
-    print_results(results, query)
+    results = await retriever.vector_search(query, top_k=5, filters=filters)
+    print_results(results, query, title="TEST 2: Recherche filtrée par catégorie")
 
 
-def test_dossier_search(retriever):
+async def test_dossier_search(retriever):
     """Test search by dossier"""
-    print("\n" + "="*80)
-    print("TEST 3: Recherche par dossier")
-    print("="*80)
-
     filters = RAGFilters(dossier_id="24/00123")
-    results = retriever.search_by_metadata_only(filters, limit=10)
-    print_results(results, "Tous les emails du dossier 24/00123")
+    results = await retriever.search_by_metadata_only(filters, limit=10)
+    print_results(results, "Tous les emails du dossier 24/00123",
+                  title="TEST 3: Recherche par dossier")
 
 
-def test_hybrid_search(retriever):
+async def test_hybrid_search(retriever):
     """Test hybrid search with graph expansion"""
-    print("\n" + "="*80)
-    print("TEST 4: Recherche hybride avec expansion graphe")
-    print("="*80)
-
     query = "Quelle est la date de l'audience?"
-    results = retriever.hybrid_search(
+    results = await retriever.hybrid_search(
         query,
         top_k=3,
         expand_graph=True,
@@ -75,33 +74,26 @@ def test_hybrid_search(retriever):
         expand_cases=True,
         max_results=10
     )
-    print_results(results, query)
+    print_results(results, query, title="TEST 4: Recherche hybride avec expansion graphe")
 
 
-def test_urgent_search(retriever):
+async def test_urgent_search(retriever):
     """Test search for urgent emails"""
-    print("\n" + "="*80)
-    print("TEST 5: Recherche des emails urgents")
-    print("="*80)
-
     filters = RAGFilters(tags=["urgence"])
-    results = retriever.search_by_metadata_only(filters, limit=10)
-    print_results(results, "Emails urgents")
+    results = await retriever.search_by_metadata_only(filters, limit=10)
+    print_results(results, "Emails urgents", title="TEST 5: Recherche des emails urgents")
 
 
-def test_client_search(retriever):
+async def test_client_search(retriever):
     """Test search by sender"""
-    print("\n" + "="*80)
-    print("TEST 6: Recherche par expéditeur (client)")
-    print("="*80)
-
     query = "informations dossier"
     filters = RAGFilters(sender_email="jean.martin@email.fr")
-    results = retriever.vector_search(query, top_k=5, filters=filters)
-    print_results(results, f"{query} (from jean.martin@email.fr)")
+    results = await retriever.vector_search(query, top_k=5, filters=filters)
+    print_results(results, f"{query} (from jean.martin@email.fr)",
+                  title="TEST 6: Recherche par expéditeur (client)")
 
 
-def main():
+async def main():
     """Run all search tests"""
     print("=== Tests de Recherche RAG ===\n")
 
@@ -111,13 +103,18 @@ def main():
         retriever = get_rag_retriever()
         print("✓ Retriever initialisé\n")
 
-        # Run tests
-        test_basic_search(retriever)
-        test_filtered_search(retriever)
-        test_dossier_search(retriever)
-        test_hybrid_search(retriever)
-        test_urgent_search(retriever)
-        test_client_search(retriever)
+        # Run tests concurrently — no data dependencies between them, so
+        # the DB connection pool sees all six searches in flight at once.
+        # Each test prints its whole block after its awaits complete, so
+        # output stays contiguous per test.
+        await asyncio.gather(
+            test_basic_search(retriever),
+            test_filtered_search(retriever),
+            test_dossier_search(retriever),
+            test_hybrid_search(retriever),
+            test_urgent_search(retriever),
+            test_client_search(retriever)
+        )
 
         print("\n" + "="*80)
         print("=== Tous les tests terminés! ===")
@@ -131,4 +128,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())